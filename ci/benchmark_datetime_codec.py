@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Compares the speed of the newdle datetime codec with strptime/strftime
+on the timeslots of a large newdle.
+
+Answers are stored in their own table, so they are not decoded from
+strings anymore; formatting is still used when exporting answers and
+sending the participant list.
+"""
+
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from timeit import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from newdle.core.util import DATETIME_FORMAT, format_dt, parse_dt
+
+NUM_PARTICIPANTS = 200
+NUM_TIMESLOTS = 50
+REPEAT = 20
+
+
+def _make_answers():
+    start = datetime(2020, 1, 1, 8, 0)
+    timeslots = [start + timedelta(minutes=30 * n) for n in range(NUM_TIMESLOTS)]
+    return timeslots, [
+        [format_dt(slot) for slot in random.sample(timeslots, NUM_TIMESLOTS // 2)]
+        for __ in range(NUM_PARTICIPANTS)
+    ]
+
+
+def _benchmark(name, fn, items):
+    total = timeit(lambda: [fn(item) for row in items for item in row], number=REPEAT)
+    count = REPEAT * sum(map(len, items))
+    print(f'{name:<20} {total * 1e9 / count:8.1f} ns/call')
+    return total
+
+
+def main():
+    timeslots, answers = _make_answers()
+    strptime = _benchmark(
+        'strptime', lambda text: datetime.strptime(text, DATETIME_FORMAT), answers
+    )
+    parsed = _benchmark('parse_dt', parse_dt, answers)
+    strftime = _benchmark(
+        'strftime', lambda dt: dt.strftime(DATETIME_FORMAT), [timeslots]
+    )
+    formatted = _benchmark('format_dt', format_dt, [timeslots])
+    print(f'parse_dt is {strptime / parsed:.1f}x faster than strptime')
+    print(f'format_dt is {strftime / formatted:.1f}x faster than strftime')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ import pytest
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 from newdle.core.app import create_app
+from newdle.core.cache import cache, free_busy_cache
 from newdle.core.db import db
 from newdle.models import Newdle, Participant
 
@@ -31,6 +32,13 @@ def app():
     ctx.pop()
 
 
+@pytest.fixture(autouse=True)
+def clear_cache(app):
+    """Make sure no test sees data cached by another test."""
+    cache.clear()
+    free_busy_cache.clear()
+
+
 @pytest.fixture(scope='session')
 def database(app):
     flask_migrate.upgrade(revision='head')
@@ -1,7 +1,8 @@
 from collections import Counter
 
+from newdle.core.db import db
 from newdle.core.util import format_dt
-from newdle.models import Availability
+from newdle.models import Availability, SlotClaim
 
 
 def validate_answers(newdle, participant, answers):
@@ -37,20 +38,30 @@ def validate_answers(newdle, participant, answers):
             }
 
         # The slot must not be already taken
-        timeslot = next(
-            (
-                slot
-                for slot, availability in answers.items()
-                if availability == Availability.available
-            ),
-            None,
-        )
-        if timeslot is not None and any(
-            p.answers.get(timeslot) == Availability.available
-            for p in newdle.participants
-            if p.code != participant.code
-        ):
+        timeslot = get_selected_timeslot(answers)
+        if timeslot is not None and _is_slot_taken(newdle, participant, timeslot):
             return {
                 'code': 409,
                 'messages': {'answers': ['The selected timeslot is already taken']},
             }
+
+
+def get_selected_timeslot(answers):
+    """Get the timeslot selected in a newdle with limited slots."""
+    return next(
+        (
+            slot
+            for slot, availability in answers.items()
+            if availability == Availability.available
+        ),
+        None,
+    )
+
+
+def _is_slot_taken(newdle, participant, timeslot):
+    query = SlotClaim.query.filter(
+        SlotClaim.newdle_id == newdle.id,
+        SlotClaim.timeslot == timeslot,
+        SlotClaim.participant_id != participant.id,
+    )
+    return db.session.query(query.exists()).scalar()
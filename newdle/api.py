@@ -1,40 +1,49 @@
 import hashlib
 import uuid
-from importlib import import_module
-from urllib.parse import urlencode
+from datetime import timedelta
 
-import requests
 from faker import Faker
 from flask import (
     Blueprint,
-    Response,
     current_app,
     g,
     jsonify,
     request,
     send_file,
+    stream_with_context,
     url_for,
 )
 from itsdangerous import BadData, SignatureExpired
 from marshmallow import fields
-from marshmallow.validate import OneOf
+from marshmallow.validate import Length, OneOf, Range
 from pytz import common_timezones_set, timezone
-from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, selectinload
 from werkzeug.exceptions import Forbidden, ServiceUnavailable, UnprocessableEntity
 
-from newdle.answers import validate_answers
+from newdle.answers import get_selected_timeslot, validate_answers
+from newdle.avatars import (
+    get_avatar_data_uris,
+    get_gravatar,
+    make_gravatar_response,
+)
 from newdle.calendar import create_calendar_event
 from newdle.core.auth import search_users, user_info_from_app_token
 from newdle.core.db import db
+from newdle.core.http_client import http_client
 from newdle.core.util import (
     DATE_FORMAT,
     avatar_info_from_payload,
     change_dt_timezone,
-    range_union,
+    format_dt,
+    format_dts,
+    parse_dt,
     render_user_avatar,
 )
 from newdle.core.webargs import abort, use_args, use_kwargs
 from newdle.export import export_answers_to_csv, export_answers_to_xlsx
+from newdle.free_busy import fetch_busy_times, fetch_busy_times_batch
+from newdle.live_updates import iter_newdle_updates, publish_newdle_update
 from newdle.models import Availability, Newdle, Participant, StatKey, Stats
 from newdle.notifications import (
     notify_newdle_creator,
@@ -42,8 +51,11 @@ from newdle.notifications import (
     send_invitation_emails,
 )
 from newdle.schemas import (
+    BusyTimesUserSchema,
+    CompactParticipantSchema,
     DeletedNewdleSchema,
     MyNewdleSchema,
+    MyNewdleSummarySchema,
     NewdleParticipantSchema,
     NewdleSchema,
     NewNewdleSchema,
@@ -59,6 +71,18 @@ from newdle.schemas import (
 
 api = Blueprint('api', __name__, url_prefix='/api')
 
+# Limits for the batch free/busy endpoint
+MAX_BUSY_BATCH_USERS = 100
+MAX_BUSY_BATCH_DAYS = 31
+# Limit for the batch avatar endpoint
+MAX_AVATAR_BATCH_SIZE = 200
+# The largest avatar size (in pixels) that can be requested
+MAX_AVATAR_SIZE = 2048
+# Page size limit for the "my newdles" list
+MAX_MY_NEWDLES_PAGE_SIZE = 100
+# Page size limit for the list of newdles the user is participating in
+MAX_PARTICIPATING_PAGE_SIZE = 100
+
 
 def allow_anonymous(fn):
     fn._allow_anonymous = True
@@ -106,45 +130,63 @@ def user_avatar(payload):
     user_info = avatar_info_from_payload(payload)
     if user_info is None:
         abort(404)
-    size = request.args.get('size')
+    # normalize the size so junk values do not end up in the cache keys or
+    # in the gravatar requests
+    size = request.args.get('size', type=int)
+    if size is not None and not 1 <= size <= MAX_AVATAR_SIZE:
+        size = None
     if user_info['email'] is None:
         return render_user_avatar(user_info['initial'], size)
-    email_hex = hashlib.md5(user_info['email'].lower().encode()).hexdigest()
-    # make gravatar return 404 HTTP code instead of a default image
-    query_args = {'d': '404'}
-    if size is not None:
-        query_args['s'] = size
-    gravatar_url = f'https://gravatar.com/avatar/{email_hex}?{urlencode(query_args)}'
-    request_headers = {}
-    if 'if-modified-since' in request.headers:
-        request_headers['if-modified-since'] = request.headers['if-modified-since']
-
-    resp = requests.get(gravatar_url, headers=request_headers)
-    if resp.status_code == 404:
-        return render_user_avatar(user_info['initial'], size)
+    gravatar = get_gravatar(user_info['email'], size)
+    if gravatar is None:
+        # gravatar is unavailable, so clients should try again next time
+        return render_user_avatar(user_info['initial'], size, max_age=0)
+    elif gravatar['content'] is None:
+        # the user may still set up a gravatar, so we cannot let clients
+        # cache the fallback for long
+        return render_user_avatar(
+            user_info['initial'],
+            size,
+            max_age=current_app.config['AVATAR_NEGATIVE_CACHE_TTL'],
+        )
+    return make_gravatar_response(gravatar)
 
-    # include only the headers we care about
-    forwarded_header_names = [
-        'content-type',
-        'last-modified',
-        'cache-control',
-        'expires',
-        'date',
-        'content-disposition',
-        'etag',
-    ]
-    headers = [
-        (name, value)
-        for (name, value) in resp.headers.items()
-        if name.lower() in forwarded_header_names
-    ]
-    return Response(resp.content, resp.status_code, headers)
+
+@api.route('/avatars/', methods=('POST',))
+@allow_anonymous
+@use_kwargs(
+    {
+        'payloads': fields.List(
+            fields.String(),
+            required=True,
+            validate=Length(min=1, max=MAX_AVATAR_BATCH_SIZE),
+        ),
+        'size': fields.Integer(
+            missing=None, validate=Range(min=1, max=MAX_AVATAR_SIZE)
+        ),
+    }
+)
+def user_avatars(payloads, size):
+    payloads = list(dict.fromkeys(payloads))
+    user_infos = {
+        payload: info
+        for payload in payloads
+        if (info := avatar_info_from_payload(payload)) is not None
+    }
+    data_uris = get_avatar_data_uris(list(user_infos.values()), size)
+    avatars = dict(zip(user_infos, data_uris, strict=True))
+    # invalid payloads are included as well so the client does not keep
+    # asking for them
+    return jsonify({payload: avatars.get(payload) for payload in payloads})
 
 
 @api.route('/config/')
 @allow_anonymous
 def config():
-    return jsonify(has_event_creation=bool(current_app.config['CREATE_EVENT_URL']))
+    return jsonify(
+        has_event_creation=bool(current_app.config['CREATE_EVENT_URL']),
+        has_live_updates=current_app.config['LIVE_UPDATES_ENABLED'],
+    )
 
 
 @api.route('/ping')
@@ -280,44 +322,172 @@ def get_participant_busy_times(date, code, tz, participant_code=None):
     return _get_busy_times(date, tz, participant.auth_uid, participant.email)
 
 
+@api.route('/users/busy/batch', methods=('POST',))
+@use_kwargs(
+    {
+        'start_date': fields.Date(format=DATE_FORMAT, required=True),
+        'end_date': fields.Date(format=DATE_FORMAT, required=True),
+        'tz': fields.String(required=True, validate=OneOf(common_timezones_set)),
+        'users': fields.List(
+            fields.Nested(BusyTimesUserSchema),
+            required=True,
+            validate=Length(min=1, max=MAX_BUSY_BATCH_USERS),
+        ),
+    }
+)
+def get_busy_times_batch(start_date, end_date, tz, users):
+    num_days = (end_date - start_date).days + 1
+    if num_days < 1:
+        abort(422, messages={'end_date': ['End date is before start date']})
+    elif num_days > MAX_BUSY_BATCH_DAYS:
+        abort(422, messages={'end_date': ['Date range is too long']})
+    dates = [start_date + timedelta(days=n) for n in range(num_days)]
+    # the same user may be present more than once, but we only need to query it once
+    users = list({u['uid']: u['email'] for u in users}.items())
+    busy_times, incomplete = fetch_busy_times_batch(dates, tz, users)
+    return _busy_times_response(
+        {
+            uid: {
+                date.strftime(DATE_FORMAT): _format_busy_ranges(busy_times[(uid, date)])
+                for date in dates
+            }
+            for uid, _ in users
+        },
+        incomplete,
+    )
+
+
+def _format_busy_ranges(ranges):
+    return [
+        ['{:02}:{:02}'.format(*r[0]), '{:02}:{:02}'.format(*r[1])]
+        for r in ranges
+        if r[0] != r[1]
+    ]
+
+
+def _busy_times_response(data, incomplete):
+    resp = jsonify(data)
+    if incomplete:
+        # let the client know that some providers did not respond in time
+        resp.headers['X-Newdle-Incomplete-Providers'] = ', '.join(incomplete)
+    return resp
+
+
 def _get_busy_times(date, tz, uid, email):
-    providers = current_app.config['FREE_BUSY_PROVIDERS']
-    data = []
+    busy_times, incomplete = fetch_busy_times(date, tz, uid, email)
+    return _busy_times_response(_format_busy_ranges(busy_times), incomplete)
 
-    for name in providers:
-        module = import_module(f'newdle.providers.free_busy.{name}')
-        data += module.fetch_free_busy(date, tz, uid, email)
 
-    merged_ranges = range_union(data)
-    return jsonify(
-        [
-            ['{:02}:{:02}'.format(*r[0]), '{:02}:{:02}'.format(*r[1])]
-            for r in merged_ranges
-            if r[0] != r[1]
-        ]
+def _make_my_newdles_cursor(newdle):
+    if newdle.final_dt is None:
+        return str(newdle.id)
+    return f'{newdle.id}@{format_dt(newdle.final_dt)}'
+
+
+def _get_my_newdles_cursor_filter(cursor):
+    # rows after the cursor in the (final_dt IS NOT NULL, final_dt DESC,
+    # id DESC) ordering used for the "my newdles" list
+    id_, _, final_dt = cursor.partition('@')
+    try:
+        id_ = int(id_)
+        final_dt = parse_dt(final_dt) if final_dt else None
+    except ValueError:
+        abort(422, messages={'cursor': ['Invalid cursor']})
+    if final_dt is None:
+        return db.or_(Newdle.id < id_, Newdle.final_dt.isnot(None))
+    return db.and_(
+        Newdle.final_dt.isnot(None),
+        db.tuple_(Newdle.final_dt, Newdle.id) < db.tuple_(final_dt, id_),
     )
 
 
 @api.route('/newdles/mine')
-def get_my_newdles():
-    newdle = (
-        Newdle.query.options(selectinload(Newdle.participants))
-        .filter(Newdle.creator_uid == g.user['uid'], ~Newdle.deleted)
-        .order_by(Newdle.final_dt.isnot(None), Newdle.final_dt.desc(), Newdle.id.desc())
-        .all()
+@use_kwargs(
+    {
+        'limit': fields.Integer(
+            missing=None, validate=Range(min=1, max=MAX_MY_NEWDLES_PAGE_SIZE)
+        ),
+        'cursor': fields.String(missing=None),
+        'summary': fields.Boolean(missing=False),
+    },
+    location='query',
+)
+def get_my_newdles(limit, cursor, summary):
+    query = Newdle.query.filter(
+        Newdle.creator_uid == g.user['uid'], ~Newdle.deleted
+    ).order_by(Newdle.final_dt.isnot(None), Newdle.final_dt.desc(), Newdle.id.desc())
+    if not summary:
+        query = query.options(selectinload(Newdle.participants))
+    if cursor is not None:
+        query = query.filter(_get_my_newdles_cursor_filter(cursor))
+    if limit is not None:
+        # fetch one more row to know whether there is a next page
+        query = query.limit(limit + 1)
+    newdles = query.all()
+    has_more = limit is not None and len(newdles) > limit
+    newdles = newdles[:limit]
+    if summary:
+        Newdle.preload_available_timeslots(newdles)
+        context = {'participant_counts': Newdle.get_participant_counts(newdles)}
+        resp = MyNewdleSummarySchema(many=True, context=context).jsonify(newdles)
+    else:
+        resp = MyNewdleSchema(many=True).jsonify(newdles)
+    if has_more:
+        resp.headers['X-Newdle-Next-Cursor'] = _make_my_newdles_cursor(newdles[-1])
+    return resp
+
+
+def _make_participating_cursor(participant):
+    return f'{participant.newdle_id}:{participant.id}'
+
+
+def _get_participating_cursor_filter(cursor):
+    newdle_id, _, participant_id = cursor.partition(':')
+    try:
+        newdle_id = int(newdle_id)
+        participant_id = int(participant_id)
+    except ValueError:
+        abort(422, messages={'cursor': ['Invalid cursor']})
+    return db.tuple_(Participant.newdle_id, Participant.id) < db.tuple_(
+        newdle_id, participant_id
     )
-    return MyNewdleSchema(many=True).jsonify(newdle)
 
 
 @api.route('/newdles/participating')
-def get_newdles_participating():
-    newdle = (
+@use_kwargs(
+    {
+        'limit': fields.Integer(
+            missing=None, validate=Range(min=1, max=MAX_PARTICIPATING_PAGE_SIZE)
+        ),
+        'cursor': fields.String(missing=None),
+    },
+    location='query',
+)
+def get_newdles_participating(limit, cursor):
+    # the newdles are loaded in the same query as the participants, their
+    # answers in one more query and the taken slots in another one, so this
+    # does not depend on the number of newdles
+    query = (
         Participant.query.filter_by(auth_uid=g.user['uid'])
         .join(Participant.newdle)
+        .options(contains_eager(Participant.newdle))
         .filter(~Newdle.deleted)
-        .order_by(Newdle.id.desc())
+        .order_by(Participant.newdle_id.desc(), Participant.id.desc())
     )
-    return NewdleParticipantSchema(many=True).jsonify(newdle)
+    if cursor is not None:
+        query = query.filter(_get_participating_cursor_filter(cursor))
+    if limit is not None:
+        query = query.limit(limit + 1)
+    participants = query.all()
+    has_more = limit is not None and len(participants) > limit
+    participants = participants[:limit]
+    Newdle.preload_available_timeslots([p.newdle for p in participants])
+    resp = NewdleParticipantSchema(many=True).jsonify(participants)
+    if has_more:
+        resp.headers['X-Newdle-Next-Cursor'] = _make_participating_cursor(
+            participants[-1]
+        )
+    return resp
 
 
 @api.route('/newdle/<code>/create-event', methods=('POST',))
@@ -326,7 +496,7 @@ def create_event(code):
         'Specified newdle does not exist'
     )
     url = current_app.config['CREATE_EVENT_URL']
-    res = requests.post(
+    res = http_client.post(
         url,
         data={
             'title': newdle.title,
@@ -340,11 +510,24 @@ def create_event(code):
     return jsonify(url=res.json()['url'])
 
 
+def _unique_participants(participants, auth_uids=()):
+    # a user can participate in a newdle only once, so skip participants
+    # whose user is already in `auth_uids` or earlier in the list
+    seen = set(auth_uids)
+    for participant in participants:
+        if (auth_uid := participant.get('auth_uid')) is not None:
+            if auth_uid in seen:
+                continue
+            seen.add(auth_uid)
+        yield participant
+
+
 @api.route('/newdle/', methods=('POST',))
 @use_kwargs(NewNewdleSchema())
 def create_newdle(
     title, duration, timezone, timeslots, limited_slots, participants, private, notify
 ):
+    participants = list(_unique_participants(participants))
     newdle = Newdle(
         title=title,
         creator_uid=g.user['uid'],
@@ -376,25 +559,38 @@ def update_newdle(args, code):
     if newdle.creator_uid != g.user['uid']:
         raise Forbidden
     new_participants = []
+    changed_fields = sorted(args)
     if 'participants' in args:
         participants = args.pop('participants')
-        # Filter the new participants to be created (excluding anonymous)
+        # Filter the existing participants so we don't reset them (intersection)
+        # and discard invalid ids
+        ids = {p['id'] for p in participants if 'id' in p}
+        newdle.participants = {p for p in newdle.participants if p.id in ids}
+        # Delete the removed participants before adding new ones, since a
+        # user who was removed may be added again
+        db.session.flush()
+        # Filter the new participants to be created (excluding anonymous ones
+        # and users who are already participating)
         new_participants = {
             Participant(**p)
-            for p in participants
+            for p in _unique_participants(
+                participants, {p.auth_uid for p in newdle.participants}
+            )
             if 'id' not in p and p.get('auth_uid') is not None
         }
         Stats.increment(StatKey.participants_created, len(new_participants))
-        # Filter the existing participants so we don't reset them (intersection)
-        # and discard invalid ids
-        ids = {p['id'] for p in participants if 'id' in p}
-        newdle.participants = {p for p in newdle.participants if p.id in ids}
         newdle.participants |= new_participants
+    limited_slots = newdle.limited_slots
     for key, value in args.items():
         setattr(newdle, key, value)
-    if args:
+    if changed_fields:
         newdle.update_lastmod()
+        publish_newdle_update(newdle, 'newdle_updated', fields=changed_fields)
     db.session.flush()
+    if newdle.limited_slots != limited_slots:
+        newdle.sync_slot_claims()
+    elif 'timeslots' in args:
+        newdle.delete_stale_slot_claims()
     send_invitation_emails(newdle, new_participants)
     db.session.commit()
     return NewdleSchema().jsonify(newdle)
@@ -403,12 +599,15 @@ def update_newdle(args, code):
 @api.route('/newdle/<code>')
 @allow_anonymous
 def get_newdle(code):
-    newdle = Newdle.query.filter_by(code=code).first_or_404(
-        'Specified newdle does not exist'
-    )
-    if newdle.deleted:
-        return DeletedNewdleSchema().jsonify(newdle)
-    return RestrictedNewdleSchema().jsonify(newdle)
+    state = _get_newdle_state(code)
+
+    def _make_response():
+        newdle = Newdle.query.get(state.id)
+        if newdle.deleted:
+            return DeletedNewdleSchema().jsonify(newdle)
+        return RestrictedNewdleSchema().jsonify(newdle)
+
+    return _make_conditional_response(_get_newdle_etag(state, 'newdle'), _make_response)
 
 
 @api.route('/newdle/<code>', methods=('DELETE',))
@@ -419,19 +618,114 @@ def delete_newdle(code):
     if newdle.creator_uid != g.user['uid']:
         raise Forbidden
     newdle.deleted = True
+    publish_newdle_update(newdle, 'newdle_deleted')
     db.session.commit()
     return DeletedNewdleSchema().jsonify(newdle)
 
 
+@api.route('/newdle/<code>/updates')
+@allow_anonymous
+def get_newdle_updates(code):
+    if not current_app.config['LIVE_UPDATES_ENABLED']:
+        # this tells the browser to stop reconnecting
+        return '', 204
+    state = _get_newdle_state(code)
+    if state.private and (g.user is None or state.creator_uid != g.user['uid']):
+        raise Forbidden('You cannot view the participants of this newdle')
+    # the stream listens on its own connection, so release the session's
+    # pooled connection instead of keeping it checked out while streaming
+    db.session.close()
+    resp = current_app.response_class(
+        stream_with_context(iter_newdle_updates(state.id)),
+        mimetype='text/event-stream',
+    )
+    resp.cache_control.no_cache = True
+    # make sure reverse proxies do not buffer the events
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+
 @api.route('/newdle/<code>/participants/')
 @allow_anonymous
-def get_participants(code):
-    newdle = Newdle.query.filter_by(code=code).first_or_404(
-        'Specified newdle does not exist'
+@use_kwargs({'compact': fields.Boolean(missing=False)}, location='query')
+def get_participants(code, compact):
+    state = _get_newdle_state(code)
+    if state.private and (g.user is None or state.creator_uid != g.user['uid']):
+        raise Forbidden('You cannot view the participants of this newdle')
+
+    def _make_response():
+        newdle = Newdle.query.get(state.id)
+        if not compact:
+            return RestrictedParticipantSchema(many=True).jsonify(newdle.participants)
+        # the answers of each participant are a string with one character per
+        # timeslot, so the timeslots are only sent once
+        schema = CompactParticipantSchema(
+            many=True, context={'timeslots': newdle.timeslots}
+        )
+        return jsonify(
+            timeslots=format_dts(newdle.timeslots),
+            participants=schema.dump(newdle.participants),
+        )
+
+    etag = _get_newdle_etag(
+        state, 'participants-compact' if compact else 'participants'
     )
-    if newdle.private and (g.user is None or newdle.creator_uid != g.user['uid']):
+    return _make_conditional_response(etag, _make_response)
+
+
+@api.route('/newdle/<code>/participants/tally')
+@allow_anonymous
+def get_answer_tally(code):
+    state = _get_newdle_state(code)
+    if state.private and (g.user is None or state.creator_uid != g.user['uid']):
         raise Forbidden('You cannot view the participants of this newdle')
-    return RestrictedParticipantSchema(many=True).jsonify(newdle.participants)
+
+    def _make_response():
+        counts = Newdle.query.get(state.id).get_answer_counts()
+        return jsonify({format_dt(slot): count for slot, count in counts.items()})
+
+    return _make_conditional_response(_get_newdle_etag(state, 'tally'), _make_response)
+
+
+def _get_newdle_state(code):
+    # this is all we need to know whether a client's copy of a newdle or its
+    # participants is still up to date, so there is no need to load more
+    return (
+        Newdle.query.with_entities(
+            Newdle.id,
+            Newdle.last_update,
+            Newdle.deletion_dt,
+            Newdle.private,
+            Newdle.creator_uid,
+        )
+        .filter_by(code=code)
+        .first_or_404('Specified newdle does not exist')
+    )
+
+
+def _get_newdle_etag(state, kind):
+    # anything changing a newdle or its participants updates its last_update
+    # timestamp, except for deleting it
+    version = f'{kind}/{state.id}/{state.last_update.isoformat()}/{state.deletion_dt}'
+    return hashlib.sha1(version.encode()).hexdigest()
+
+
+def _make_conditional_response(etag, make_response):
+    """Create a response unless the client has the latest version already.
+
+    :param etag: the current ETag of the requested data
+    :param make_response: a callable creating the response; it is only
+                          called if the ETag sent by the client does not
+                          match (or if there is none)
+    """
+    if etag in request.if_none_match:
+        resp = current_app.response_class(status=304)
+    else:
+        resp = make_response()
+    resp.set_etag(etag)
+    # clients may keep the response, but need to check if it is up to date
+    resp.cache_control.no_cache = True
+    return resp
 
 
 @api.route('/newdle/<code>/participants/me')
@@ -449,11 +743,23 @@ def get_participant_me(code):
 @api.route('/newdle/<code>/participants/<participant_code>')
 @allow_anonymous
 def get_participant(code, participant_code):
-    participant = Participant.query.filter(
-        Participant.newdle.has(Newdle.code == code),
-        Participant.code == participant_code,
-    ).first_or_404('Specified participant does not exist')
-    return ParticipantSchema().jsonify(participant)
+    state = (
+        Participant.query.join(Participant.newdle)
+        .with_entities(
+            Participant.id.label('participant_id'),
+            Newdle.id,
+            Newdle.last_update,
+            Newdle.deletion_dt,
+        )
+        .filter(Newdle.code == code, Participant.code == participant_code)
+        .first_or_404('Specified participant does not exist')
+    )
+    return _make_conditional_response(
+        _get_newdle_etag(state, f'participant/{state.participant_id}'),
+        lambda: ParticipantSchema().jsonify(
+            Participant.query.get(state.participant_id)
+        ),
+    )
 
 
 @api.route('/newdle/<code>/participants/<participant_code>', methods=('PATCH',))
@@ -477,8 +783,18 @@ def update_participant(args, code, participant_code):
     is_update = bool(participant.answers)
     for key, value in args.items():
         setattr(participant, key, value)
+    if newdle.limited_slots and 'answers' in args:
+        # someone else may have taken the slot since we validated the answers
+        if not participant.claim_slot(get_selected_timeslot(args['answers'])):
+            abort(409, messages={'answers': ['The selected timeslot is already taken']})
     if args:
         newdle.update_lastmod()
+        publish_newdle_update(
+            newdle,
+            'participant_updated',
+            participant=participant.id,
+            fields=sorted(args),
+        )
     db.session.flush()
     if newdle.notify:
         subject = (
@@ -527,6 +843,8 @@ def create_unknown_participant(args, code):
     newdle.participants.add(participant)
     newdle.update_lastmod()
     Stats.increment(StatKey.participants_created)
+    db.session.flush()
+    publish_newdle_update(newdle, 'participant_created', participant=participant.id)
     db.session.commit()
     return ParticipantSchema().jsonify(participant)
 
@@ -539,14 +857,25 @@ def create_participant(code):
     participant = Participant.query.filter_by(
         newdle=newdle, auth_uid=g.user['uid']
     ).first()
-    if not participant:
-        participant = Participant(
-            name=g.user['name'], email=g.user['email'], auth_uid=g.user['uid']
-        )
-        newdle.participants.add(participant)
-        newdle.update_lastmod()
-        Stats.increment(StatKey.participants_created)
-        db.session.commit()
+    if participant:
+        return ParticipantSchema().jsonify(participant)
+    participant = Participant(
+        name=g.user['name'], email=g.user['email'], auth_uid=g.user['uid']
+    )
+    try:
+        with db.session.begin_nested():
+            newdle.participants.add(participant)
+            db.session.flush()
+    except IntegrityError:
+        # the same user was added concurrently (e.g. from another tab)
+        participant = Participant.query.filter_by(
+            newdle=newdle, auth_uid=g.user['uid']
+        ).one()
+        return ParticipantSchema().jsonify(participant)
+    newdle.update_lastmod()
+    Stats.increment(StatKey.participants_created)
+    publish_newdle_update(newdle, 'participant_created', participant=participant.id)
+    db.session.commit()
     return ParticipantSchema().jsonify(participant)
 
 
@@ -0,0 +1,134 @@
+import hashlib
+import time
+from base64 import b64encode
+from urllib.parse import urlencode
+
+import requests
+from flask import Response, current_app, request
+from werkzeug.http import parse_cache_control_header
+
+from newdle.core.cache import cache
+from newdle.core.http_client import http_client
+from newdle.core.util import get_executor, get_user_avatar_svg
+
+# the gravatar response headers we keep and send to the client
+CACHED_HEADER_NAMES = {
+    'content-type',
+    'last-modified',
+    'content-disposition',
+    'etag',
+}
+
+
+def _get_ttl(resp):
+    cache_control = parse_cache_control_header(resp.headers.get('cache-control'))
+    if cache_control.no_store or cache_control.no_cache:
+        return 0
+    if cache_control.max_age is not None:
+        return min(cache_control.max_age, current_app.config['AVATAR_CACHE_MAX_TTL'])
+    return current_app.config['AVATAR_CACHE_TTL']
+
+
+def _fetch_gravatar(email_hex, size):
+    # make gravatar return 404 HTTP code instead of a default image
+    query_args = {'d': '404'}
+    if size is not None:
+        query_args['s'] = size
+    gravatar_url = f'https://gravatar.com/avatar/{email_hex}?{urlencode(query_args)}'
+    try:
+        resp = http_client.get(gravatar_url)
+    except requests.RequestException:
+        current_app.logger.warning('Could not fetch avatar from gravatar')
+        return None, 0
+
+    if resp.status_code == 404:
+        # the user has no gravatar; this is cached as well so we do not keep
+        # asking gravatar about it
+        return {'content': None}, current_app.config['AVATAR_NEGATIVE_CACHE_TTL']
+    elif resp.status_code != 200:
+        return None, 0
+
+    headers = {
+        name.lower(): value
+        for name, value in resp.headers.items()
+        if name.lower() in CACHED_HEADER_NAMES
+    }
+    return {'content': resp.content, 'headers': headers}, _get_ttl(resp)
+
+
+def get_gravatar(email, size):
+    """Get the gravatar of an email address.
+
+    Both existing and missing gravatars are cached according to the
+    cache headers sent by gravatar.
+
+    :return: a dict containing the ``content`` and ``headers`` of the
+             gravatar and the time it ``expires`` at (the ``content`` is
+             ``None`` if there is no gravatar for the email address), or
+             ``None`` if gravatar could not be queried
+    """
+    email_hex = hashlib.md5(email.lower().encode()).hexdigest()
+    key = f'gravatar/{email_hex}/{size}'
+    entry = cache.get(key)
+    if entry is None:
+        entry, ttl = _fetch_gravatar(email_hex, size)
+        if entry is None:
+            return None
+        entry['expires'] = time.time() + ttl
+        if ttl:
+            cache.set(key, entry, timeout=ttl)
+    return entry
+
+
+def make_gravatar_response(entry):
+    """Create a response for a cached gravatar.
+
+    The response is conditional, i.e. a client which already has the
+    gravatar gets an empty 304 response.
+    """
+    resp = Response(entry['content'], headers=entry['headers'])
+    resp.cache_control.public = True
+    resp.cache_control.max_age = max(0, int(entry['expires'] - time.time()))
+    if 'etag' not in entry['headers']:
+        resp.add_etag()
+    return resp.make_conditional(request)
+
+
+def _get_gravatar_in_app_context(app, email, size):
+    with app.app_context():
+        return get_gravatar(email, size)
+
+
+def _make_data_uri(content_type, content):
+    return f'data:{content_type};base64,{b64encode(content).decode()}'
+
+
+def get_avatar_data_uris(user_infos, size):
+    """Get the avatars of many users as data URIs.
+
+    Gravatar is queried concurrently for all users who have an email
+    address; the initials avatar is used for everyone else.
+
+    :param user_infos: a list of avatar infos as returned by
+                       :func:`~newdle.core.util.avatar_info_from_payload`
+    :param size: the size of the avatars
+    :return: a list containing the data URI of each user's avatar
+    """
+    app = current_app._get_current_object()
+    executor = get_executor('avatars', 'AVATAR_MAX_WORKERS')
+    emails = {info['email'] for info in user_infos if info['email'] is not None}
+    futures = {
+        email: executor.submit(_get_gravatar_in_app_context, app, email, size)
+        for email in emails
+    }
+    gravatars = {email: future.result() for email, future in futures.items()}
+    data_uris = []
+    for info in user_infos:
+        gravatar = gravatars.get(info['email'])
+        if gravatar is not None and gravatar['content'] is not None:
+            content_type = gravatar['headers'].get('content-type', 'image/jpeg')
+            data_uris.append(_make_data_uri(content_type, gravatar['content']))
+        else:
+            svg, __ = get_user_avatar_svg(info['initial'], size)
+            data_uris.append(_make_data_uri('image/svg+xml', svg))
+    return data_uris
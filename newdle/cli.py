@@ -5,7 +5,9 @@ import click
 from flask import Blueprint, current_app
 from sqlalchemy import and_, or_
 
+from newdle.core.cache import cache, is_shared_cache
 from newdle.core.db import db
+from newdle.free_busy import invalidate_busy_times_cache
 from newdle.models import Newdle
 from newdle.providers.free_busy.util import (
     get_msal_app,
@@ -76,6 +78,24 @@ def cleanup_newdles(dry_run):
         db.session.commit()
 
 
+@cli.cli.command('clear-free-busy-cache')
+@click.option(
+    '-p',
+    '--provider',
+    help='Only clear the cached data of this free/busy provider',
+)
+def clear_free_busy_cache(provider):
+    """Clear the cached free/busy data."""
+    if not is_shared_cache(cache):
+        print(
+            'The cache is local to each process and cannot be cleared from here; '
+            'restart newdle instead'
+        )
+        sys.exit(1)
+    invalidate_busy_times_cache(provider)
+    print('Free/busy cache cleared')
+
+
 @cli.cli.command('exchange-token')
 @click.option(
     '-f',
@@ -124,3 +144,22 @@ def get_exchange_token(force, dump_token):
     print(f'Got access token for {username}')
     if dump_token:
         print(result['access_token'])
+
+
+@cli.cli.command('refresh-exchange-metadata')
+def refresh_exchange_metadata():
+    """Reload the metadata (e.g. timezone) of the Exchange service account."""
+    if exchangelib is None:
+        print('exchangelib is not available')
+        sys.exit(1)
+    if not is_shared_cache(cache):
+        print(
+            'The cache is local to each process so the metadata cannot be '
+            'refreshed from here; restart newdle instead'
+        )
+        sys.exit(1)
+
+    from newdle.providers.free_busy.exchange import refresh_account_metadata
+
+    refresh_account_metadata()
+    print('Exchange account metadata will be reloaded')
@@ -113,20 +113,23 @@ export function removeParticipant(participant) {
   return {type: REMOVE_PARTICIPANT, participant};
 }
 
+// maximum number of users the server accepts in a single busy times batch
+const BUSY_TIMES_BATCH_SIZE = 100;
+
 export function fetchParticipantBusyTimes(participants, date, tz) {
   return async dispatch => {
-    participants.forEach(async participant => {
+    participants.forEach(participant => {
       dispatch({type: SET_PARTICIPANT_BUSY_TIMES, id: participant.auth_uid, date, times: null});
-      const times = await client.catchErrors(
-        client.getBusyTimes(date, tz, participant.auth_uid, participant.email)
-      );
-
-      if (times !== undefined) {
-        dispatch({type: SET_PARTICIPANT_BUSY_TIMES, id: participant.auth_uid, date, times});
-      } else {
-        dispatch({type: SET_PARTICIPANT_BUSY_TIMES, id: participant.auth_uid, date, times: []});
-      }
     });
+    for (let i = 0; i < participants.length; i += BUSY_TIMES_BATCH_SIZE) {
+      const batch = participants.slice(i, i + BUSY_TIMES_BATCH_SIZE);
+      const users = batch.map(p => ({uid: p.auth_uid, email: p.email}));
+      const results = await client.catchErrors(client.getBusyTimesBatch(date, date, tz, users));
+      batch.forEach(participant => {
+        const times = results !== undefined ? results[participant.auth_uid][date] : [];
+        dispatch({type: SET_PARTICIPANT_BUSY_TIMES, id: participant.auth_uid, date, times});
+      });
+    }
   };
 }
 
@@ -204,6 +204,18 @@ class Client {
     }
   }
 
+  getBusyTimesBatch(startDate, endDate, tz, users) {
+    return this._request(flask`api.get_busy_times_batch`(), {
+      method: 'POST',
+      body: JSON.stringify({
+        start_date: startDate,
+        end_date: endDate,
+        tz,
+        users,
+      }),
+    });
+  }
+
   setFinalDate(code, finalDate) {
     return this.updateNewdle(code, {final_dt: finalDate});
   }
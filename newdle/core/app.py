@@ -8,9 +8,10 @@ from newdle.api import api
 from newdle.auth import auth
 from newdle.cli import cli
 from newdle.core.auth import multipass
-from newdle.core.cache import cache
+from newdle.core.cache import init_caches
 from newdle.core.db import db, migrate
 from newdle.core.marshmallow import mm
+from newdle.core.query_stats import init_query_stats
 from newdle.core.util import dedent
 
 
@@ -89,8 +90,9 @@ def create_app(config_override=None, use_env_config=True):
     if not app.config['SKIP_LOGIN']:
         _configure_multipass(app)
     _configure_db(app)
+    init_query_stats(app)
     _configure_errors(app)
-    cache.init_app(app)
+    init_caches(app)
     mm.init_app(app)
     app.add_template_filter(dedent)
     app.register_blueprint(api)
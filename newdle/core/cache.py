@@ -1,3 +1,19 @@
 from flask_caching import Cache
+from flask_caching.backends import NullCache, SimpleCache
 
 cache = Cache(with_jinja2_ext=False)
+
+# free/busy data of every user and day ends up in this cache, which is kept
+# separate so it can never cause other data (e.g. the Exchange token) to be
+# evicted from the main cache
+free_busy_cache = Cache(with_jinja2_ext=False)
+
+
+def init_caches(app):
+    cache.init_app(app)
+    free_busy_cache.init_app(app, app.config['FREE_BUSY_CACHE'])
+
+
+def is_shared_cache(cache):
+    """Check whether a cache is shared by all processes."""
+    return not isinstance(cache.cache, (NullCache, SimpleCache))
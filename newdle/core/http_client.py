@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+
+class HTTPClient:
+    """A shared client for all outbound HTTP requests.
+
+    It keeps a pool of keep-alive connections per host, applies the
+    configured timeouts and retry policy to every request, and records
+    some basic metrics for each host. The metrics of a host are logged
+    along with each request to it (at the warning level if it failed).
+    """
+
+    def __init__(self):
+        self._session = None
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(
+            lambda: {'requests': 0, 'errors': 0, 'retries': 0, 'time': 0.0}
+        )
+
+    def _create_session(self):
+        config = current_app.config
+        retry = Retry(
+            total=config['HTTP_MAX_RETRIES'],
+            # a server that is slow to respond is unlikely to be faster on the
+            # next attempt, and retrying would multiply the read timeout
+            read=0,
+            backoff_factor=config['HTTP_RETRY_BACKOFF'],
+            status_forcelist={502, 503, 504},
+            # only idempotent requests are retried
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=config['HTTP_POOL_HOSTS'],
+            pool_maxsize=config['HTTP_POOL_SIZE'],
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session()
+            return self._session
+
+    def reset(self):
+        """Close all connections and discard the collected metrics."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._metrics.clear()
+
+    def request(self, method, url, **kwargs):
+        """Send a request using the shared session.
+
+        This accepts the same arguments as :func:`requests.request`, but
+        uses the configured timeouts unless a custom one is specified.
+        """
+        kwargs.setdefault(
+            'timeout',
+            (
+                current_app.config['HTTP_CONNECT_TIMEOUT'],
+                current_app.config['HTTP_READ_TIMEOUT'],
+            ),
+        )
+        start = time.monotonic()
+        try:
+            resp = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(url, start, None)
+            raise
+        self._record(url, start, resp)
+        return resp
+
+    def _record(self, url, start, resp):
+        host = urlsplit(url).hostname
+        duration = time.monotonic() - start
+        failed = resp is None or resp.status_code >= 500
+        with self._lock:
+            metrics = self._metrics[host]
+            metrics['requests'] += 1
+            metrics['time'] += duration
+            if failed:
+                metrics['errors'] += 1
+            if resp is not None and (retries := getattr(resp.raw, 'retries', None)):
+                metrics['retries'] += len(retries.history)
+            metrics = dict(metrics)
+        if failed:
+            current_app.logger.warning(
+                'HTTP request to %s failed after %.2fs (%s)', host, duration, metrics
+            )
+        else:
+            current_app.logger.debug(
+                'HTTP request to %s took %.2fs (%s)', host, duration, metrics
+            )
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get_metrics(self):
+        """Get the request metrics of each host.
+
+        :return: a dict mapping host names to dicts containing the number
+                 of requests, errors (connection errors and 5xx responses)
+                 and retries, and the total time spent on requests
+        """
+        with self._lock:
+            return {host: dict(metrics) for host, metrics in self._metrics.items()}
+
+
+http_client = HTTPClient()
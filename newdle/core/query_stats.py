@@ -0,0 +1,93 @@
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+from newdle.core.db import db
+
+
+class QueryStats:
+    """Statistics about the SQL queries executed during a request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.slowest_duration = 0
+        self.slowest_statement = None
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        if duration > self.slowest_duration:
+            self.slowest_duration = duration
+            self.slowest_statement = statement
+
+    def __str__(self):
+        return f'count={self.count}; duration={self.duration * 1000:.1f}ms'
+
+
+def get_query_stats():
+    """Get the query statistics of the current request (or ``None``)."""
+    return g.get('query_stats') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _record_query(conn, statement):
+    duration = time.perf_counter() - conn.info['query_start_time'].pop()
+    if (stats := get_query_stats()) is not None:
+        stats.add(statement, duration)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record_query(conn, statement)
+
+
+def _handle_error(exception_context):
+    # a failed statement does not trigger `after_cursor_execute`, but its
+    # start time must still be removed from the (long-lived) connection
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start_time'):
+        _record_query(conn, exception_context.statement)
+
+
+def _start_request():
+    g.query_stats = QueryStats()
+
+
+def _finish_request(response):
+    stats = g.pop('query_stats', None)
+    if stats is None:
+        return response
+    if current_app.debug:
+        response.headers['X-Newdle-Query-Stats'] = str(stats)
+    budget = current_app.config['QUERY_TIME_BUDGET']
+    if budget is not None and stats.duration > budget:
+        current_app.logger.warning(
+            'Request to %s exceeded the query time budget (%s); slowest query '
+            '(%.1fms): %s',
+            request.path,
+            stats,
+            stats.slowest_duration * 1000,
+            stats.slowest_statement,
+        )
+    else:
+        current_app.logger.debug('Queries for %s: %s', request.path, stats)
+    return response
+
+
+def init_query_stats(app):
+    """Record the number and duration of the SQL queries of each request.
+
+    In debug mode the statistics are sent in the ``X-Newdle-Query-Stats``
+    response header. Requests whose queries take longer than the
+    ``QUERY_TIME_BUDGET`` are logged along with their slowest query.
+    """
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(db.engine, 'handle_error', _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -6,18 +6,19 @@ from operator import itemgetter
 
 from xlsxwriter import Workbook
 
-from newdle.core.util import format_dt
+from newdle.core.util import format_dts
 
 
 def _generate_answers_for_export(newdle):
-    slots = [format_dt(slot) for slot in newdle.timeslots]
+    slots = format_dts(newdle.timeslots)
     rows = []
     rows.append(['Participant name', *slots, 'Comment'])
 
     for p in newdle.participants:
+        participant_answers = p.answers
         answers = [p.name]
         for slot in newdle.timeslots:
-            if answer := p.answers.get(slot):
+            if answer := participant_answers.get(slot):
                 answers.append(answer.name)
             else:
                 answers.append('')
@@ -0,0 +1,158 @@
+import hashlib
+import time
+import uuid
+from collections import defaultdict
+from importlib import import_module
+
+from flask import current_app
+
+from newdle.core.cache import cache, free_busy_cache
+from newdle.core.util import DATE_FORMAT, get_executor, range_union
+
+
+def get_provider(name):
+    """Get the module of a free/busy provider."""
+    return import_module(f'newdle.providers.free_busy.{name}')
+
+
+def _fetch_from_provider(provider, dates, tz, users):
+    # providers which can query many users/dates at once expose a batch
+    # function, for all others we simply query each user and date separately
+    if fetch_batch := getattr(provider, 'fetch_free_busy_batch', None):
+        return fetch_batch(dates, tz, users)
+    return {
+        (uid, date): provider.fetch_free_busy(date, tz, uid, email)
+        for uid, email in users
+        for date in dates
+    }
+
+
+def _get_cache_namespace(name):
+    # all cache keys of a provider contain this token, so replacing it is
+    # enough to invalidate all the cached data of that provider
+    key = f'free-busy-ns/{name}'
+    if not (namespace := cache.get(key)):
+        namespace = uuid.uuid4().hex
+        cache.set(key, namespace, timeout=0)
+    return namespace
+
+
+def _make_cache_key(namespace, uid, email, date, tz):
+    # providers may look people up by email instead of uid, so both are part
+    # of the key to avoid caching someone's data under someone else's uid
+    user_hash = hashlib.sha1(f'{uid}\n{email or ""}'.encode()).hexdigest()
+    return f'free-busy/{namespace}/{user_hash}/{date.strftime(DATE_FORMAT)}/{tz}'
+
+
+def _fetch_cached(name, dates, tz, users):
+    provider = get_provider(name)
+    ttl = current_app.config['FREE_BUSY_CACHE_TTL']
+    if not ttl:
+        return _fetch_from_provider(provider, dates, tz, users)
+
+    namespace = _get_cache_namespace(name)
+    keys = {
+        (uid, email, date): _make_cache_key(namespace, uid, email, date, tz)
+        for uid, email in users
+        for date in dates
+    }
+    cached = zip(keys, free_busy_cache.get_many(*keys.values()), strict=True)
+    results = {}
+    missing = set()
+    for (uid, email, date), ranges in cached:
+        if ranges is None:
+            missing.add((uid, email, date))
+        else:
+            results[(uid, date)] = ranges
+    if missing:
+        missing_pairs = {(uid, email) for uid, email, _ in missing}
+        missing_dates = sorted({date for _, _, date in missing})
+        missing_users = [user for user in users if user in missing_pairs]
+        fetched = _fetch_from_provider(provider, missing_dates, tz, missing_users)
+        emails = dict(missing_users)
+        free_busy_cache.set_many(
+            {
+                keys[(uid, emails[uid], date)]: ranges
+                for (uid, date), ranges in fetched.items()
+            },
+            ttl,
+        )
+        results.update(fetched)
+    return results
+
+
+def invalidate_busy_times_cache(name=None):
+    """Discard cached free/busy data.
+
+    :param name: the name of the provider whose data should be discarded;
+                 if omitted, the data of all providers is discarded
+    """
+    names = [name] if name else current_app.config['FREE_BUSY_PROVIDERS']
+    cache.delete_many(*(f'free-busy-ns/{x}' for x in names))
+
+
+def _run_in_app_context(app, fn, *args):
+    with app.app_context():
+        return fn(*args)
+
+
+def _get_provider_timeout(name):
+    timeouts = current_app.config['FREE_BUSY_PROVIDER_TIMEOUTS']
+    return timeouts.get(name, current_app.config['FREE_BUSY_PROVIDER_TIMEOUT'])
+
+
+def fetch_busy_times_batch(dates, tz, users):
+    """Get the busy times of many users on many dates.
+
+    All providers are queried concurrently. A provider which does not
+    respond within its timeout is skipped and its name is returned in
+    the list of incomplete providers. Results are cached for
+    ``FREE_BUSY_CACHE_TTL`` seconds.
+
+    :param dates: the dates to get busy times for
+    :param tz: the name of the timezone of reference
+    :param users: a list of ``(uid, email)`` tuples
+    :return: a ``(busy_times, incomplete)`` tuple, where ``busy_times``
+             is a dict mapping ``(uid, date)`` to a list of merged
+             ``(H, M)`` ranges and ``incomplete`` is a list of the
+             providers which did not respond in time
+    """
+    app = current_app._get_current_object()
+    executor = get_executor('free-busy', 'FREE_BUSY_MAX_WORKERS')
+    started = time.monotonic()
+    futures = {
+        name: executor.submit(
+            _run_in_app_context, app, _fetch_cached, name, dates, tz, users
+        )
+        for name in sorted(current_app.config['FREE_BUSY_PROVIDERS'])
+    }
+    data = defaultdict(list)
+    incomplete = []
+    for name, future in futures.items():
+        remaining = started + _get_provider_timeout(name) - time.monotonic()
+        try:
+            results = future.result(timeout=max(remaining, 0))
+        except TimeoutError:
+            # the provider keeps running in the background, so its data may
+            # still end up in the cache and be available for later requests
+            current_app.logger.warning('Free/busy provider %s timed out', name)
+            incomplete.append(name)
+            continue
+        for key, ranges in results.items():
+            data[key] += ranges
+    busy_times = {
+        (uid, date): range_union(data[(uid, date)])
+        for uid, _ in users
+        for date in dates
+    }
+    return busy_times, incomplete
+
+
+def fetch_busy_times(date, tz, uid, email):
+    """Get the busy times of a user on a given date.
+
+    :return: a ``(busy_times, incomplete)`` tuple; see
+             :func:`fetch_busy_times_batch` for details.
+    """
+    busy_times, incomplete = fetch_busy_times_batch([date], tz, [(uid, email)])
+    return busy_times[(uid, date)], incomplete
@@ -0,0 +1,81 @@
+import json
+import select
+import time
+
+from flask import current_app
+
+from newdle.core.db import db
+
+
+def _get_channel(newdle_id):
+    return f'newdle_{newdle_id}'
+
+
+def publish_newdle_update(newdle, type_, **data):
+    """Notify everyone following a newdle's live updates about a change.
+
+    The notification is sent using Postgres' NOTIFY, so it is only sent
+    once (and if) the current transaction is committed, and it reaches
+    clients connected to any worker.
+
+    :param newdle: the newdle which changed
+    :param type_: the type of the change, e.g. ``participant_updated``
+    :param data: details about the change; this is sent to anyone who can
+                 access the newdle, so it must not contain private data
+    """
+    if not current_app.config['LIVE_UPDATES_ENABLED']:
+        return
+    payload = json.dumps({'type': type_, **data})
+    db.session.execute(db.select(db.func.pg_notify(_get_channel(newdle.id), payload)))
+
+
+def _connect():
+    # each stream keeps its connection open for a long time, so it uses a
+    # dedicated one instead of exhausting the pool used by other requests
+    dialect = db.engine.dialect
+    cargs, cparams = dialect.create_connect_args(db.engine.url)
+    return dialect.connect(*cargs, **cparams)
+
+
+def _listen(channel, timeout):
+    # yield the payload of each notification sent on the channel, or `None`
+    # whenever no notification arrived within `timeout` seconds
+    conn = _connect()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {channel}')
+        while True:
+            if not select.select([conn], [], [], timeout)[0]:
+                yield None
+                continue
+            conn.poll()
+            while conn.notifies:
+                yield conn.notifies.pop(0).payload
+    finally:
+        conn.close()
+
+
+def _format_event(payload):
+    data = json.loads(payload)
+    return f'event: {data.pop("type")}\ndata: {json.dumps(data)}\n\n'
+
+
+def iter_newdle_updates(newdle_id):
+    """Stream the live updates of a newdle as server-sent events.
+
+    Comments are sent regularly to keep the connection alive. The stream
+    ends after ``LIVE_UPDATES_MAX_DURATION`` seconds so it does not keep a
+    worker busy forever; clients reconnect automatically.
+    """
+    config = current_app.config
+    deadline = time.monotonic() + config['LIVE_UPDATES_MAX_DURATION']
+    yield f'retry: {config["LIVE_UPDATES_RETRY_DELAY"] * 1000}\n\n'
+    listener = _listen(_get_channel(newdle_id), config['LIVE_UPDATES_KEEPALIVE'])
+    try:
+        for payload in listener:
+            yield ': keepalive\n\n' if payload is None else _format_event(payload)
+            if time.monotonic() >= deadline:
+                break
+    finally:
+        listener.close()
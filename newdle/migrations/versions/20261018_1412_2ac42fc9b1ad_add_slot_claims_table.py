@@ -0,0 +1,59 @@
+"""Add slot claims table
+
+Revision ID: 2ac42fc9b1ad
+Revises: cab5d47c1152
+Create Date: 2026-10-18 14:12:37.418265
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '2ac42fc9b1ad'
+down_revision = 'cab5d47c1152'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'slot_claims',
+        sa.Column('newdle_id', sa.Integer(), nullable=False),
+        sa.Column('timeslot', sa.DateTime(), nullable=False),
+        sa.Column('participant_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['newdle_id'],
+            ['newdles.id'],
+            name=op.f('fk_slot_claims_newdle_id_newdles'),
+            ondelete='CASCADE',
+        ),
+        sa.ForeignKeyConstraint(
+            ['participant_id'],
+            ['participants.id'],
+            name=op.f('fk_slot_claims_participant_id_participants'),
+            ondelete='CASCADE',
+        ),
+        sa.PrimaryKeyConstraint('newdle_id', 'timeslot', name=op.f('pk_slot_claims')),
+    )
+    op.create_index(
+        op.f('ix_uq_slot_claims_participant_id'),
+        'slot_claims',
+        ['participant_id'],
+        unique=True,
+    )
+    op.execute(
+        """
+        INSERT INTO slot_claims (newdle_id, timeslot, participant_id)
+        SELECT p.newdle_id, a.key::timestamp, p.id
+        FROM participants p
+        JOIN newdles n ON n.id = p.newdle_id
+        CROSS JOIN jsonb_each_text(p.answers) a
+        WHERE n.limited_slots AND a.value = 'available'
+        ON CONFLICT DO NOTHING;
+        """
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_uq_slot_claims_participant_id'), table_name='slot_claims')
+    op.drop_table('slot_claims')
@@ -0,0 +1,69 @@
+"""Move answers to their own table
+
+Revision ID: 5bfd5f0a2aa5
+Revises: 2ac42fc9b1ad
+Create Date: 2026-10-18 15:36:04.511940
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '5bfd5f0a2aa5'
+down_revision = '2ac42fc9b1ad'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'answers',
+        sa.Column('participant_id', sa.Integer(), nullable=False),
+        sa.Column('timeslot', sa.DateTime(), nullable=False),
+        sa.Column(
+            'availability',
+            sa.Enum('unavailable', 'available', 'ifneedbe', name='availability'),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ['participant_id'],
+            ['participants.id'],
+            name=op.f('fk_answers_participant_id_participants'),
+            ondelete='CASCADE',
+        ),
+        sa.PrimaryKeyConstraint('participant_id', 'timeslot', name=op.f('pk_answers')),
+    )
+    op.execute(
+        """
+        INSERT INTO answers (participant_id, timeslot, availability)
+        SELECT p.id, a.key::timestamp, a.value::availability
+        FROM participants p
+        CROSS JOIN jsonb_each_text(p.answers) a;
+        """
+    )
+    op.drop_column('participants', 'answers')
+
+
+def downgrade():
+    op.add_column(
+        'participants',
+        sa.Column('answers', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE participants p
+        SET answers = COALESCE(
+            (
+                SELECT jsonb_object_agg(
+                    to_char(a.timeslot, 'YYYY-MM-DD"T"HH24:MI'), a.availability
+                )
+                FROM answers a
+                WHERE a.participant_id = p.id
+            ),
+            '{}'
+        );
+        """
+    )
+    op.drop_table('answers')
+    op.execute('DROP TYPE availability')
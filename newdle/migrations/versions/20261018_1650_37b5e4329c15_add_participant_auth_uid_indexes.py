@@ -0,0 +1,78 @@
+"""Add participant auth_uid indexes
+
+Duplicate participants of the same user are deleted (along with their
+answers) before adding the unique index. The downgrade does NOT restore
+them.
+
+Revision ID: 37b5e4329c15
+Revises: 5bfd5f0a2aa5
+Create Date: 2026-10-18 16:50:21.730184
+"""
+
+import logging
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '37b5e4329c15'
+down_revision = '5bfd5f0a2aa5'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def upgrade():
+    # remove duplicate participants of the same user (created by concurrent
+    # requests), keeping the one with the most answers
+    query = sa.text(
+        """
+        DELETE FROM participants
+        WHERE id IN (
+            SELECT id
+            FROM (
+                SELECT
+                    p.id,
+                    row_number() OVER (
+                        PARTITION BY p.newdle_id, p.auth_uid
+                        ORDER BY
+                            (SELECT count(*) FROM answers a WHERE a.participant_id = p.id)
+                            DESC,
+                            p.id
+                    ) AS num
+                FROM participants p
+                WHERE p.auth_uid IS NOT NULL
+            ) duplicates
+            WHERE num > 1
+        )
+        RETURNING id, newdle_id, auth_uid
+        """
+    )
+    deleted = op.get_bind().execute(query).all()
+    for participant_id, newdle_id, auth_uid in deleted:
+        logger.warning(
+            'Deleted duplicate participant %d of user %s in newdle %d',
+            participant_id,
+            auth_uid,
+            newdle_id,
+        )
+    if deleted:
+        logger.warning('Deleted %d duplicate participants', len(deleted))
+    op.create_index(
+        op.f('ix_participants_auth_uid'), 'participants', ['auth_uid'], unique=False
+    )
+    op.create_index(
+        op.f('ix_uq_participants_newdle_id_auth_uid'),
+        'participants',
+        ['newdle_id', 'auth_uid'],
+        unique=True,
+    )
+
+
+def downgrade():
+    # the duplicate participants deleted during the upgrade are gone for good
+    op.drop_index(
+        op.f('ix_uq_participants_newdle_id_auth_uid'), table_name='participants'
+    )
+    op.drop_index(op.f('ix_participants_auth_uid'), table_name='participants')
@@ -3,13 +3,14 @@ from datetime import datetime
 from enum import auto
 
 from flask import current_app
-from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.event import listens_for
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import attribute_keyed_dict
 from sqlalchemy.schema import CheckConstraint
 
 from newdle.core.db import db
-from newdle.core.util import AutoNameEnum, format_dt, parse_dt
+from newdle.core.util import AutoNameEnum, format_dt
 
 CODE_ALPHABET = '23456789bcdfghjkmnpqrstvwxyzBCDFGHJKLMNPQRSTVWXYZ'
 
@@ -97,14 +98,140 @@ class Newdle(db.Model):
         if not self.limited_slots:
             return self.timeslots
 
-        used_slots = {
-            slot
-            for p in self.participants
-            for slot, answer in p.answers.items()
-            if answer == Availability.available
-        }
+        if 'participants' in self.__dict__:
+            # the participants are already loaded, so there is no need to
+            # query the database again
+            used_slots = {
+                slot
+                for p in self.participants
+                for slot, answer in p.answers.items()
+                if answer == Availability.available
+            }
+        elif (used_slots := self.__dict__.get('_taken_timeslots')) is None:
+            used_slots = Newdle.get_taken_timeslots([self])[self.id]
         return sorted(set(self.timeslots) - used_slots)
 
+    @staticmethod
+    def get_taken_timeslots(newdles):
+        """Get the timeslots someone answered with 'available' for.
+
+        This uses a single query for all newdles, regardless of how many
+        there are and whether their participants are already loaded.
+
+        :return: a dict mapping the id of each newdle with limited slots to
+                 the set of its taken timeslots
+        """
+        taken = {newdle.id: set() for newdle in newdles if newdle.limited_slots}
+        if not taken:
+            return taken
+        query = (
+            db.session.query(Participant.newdle_id, Answer.timeslot)
+            .join(Answer.participant)
+            .filter(
+                Participant.newdle_id.in_(taken),
+                Answer.availability == Availability.available,
+            )
+        )
+        for newdle_id, timeslot in query:
+            taken[newdle_id].add(timeslot)
+        return taken
+
+    @staticmethod
+    def preload_available_timeslots(newdles):
+        """Preload the available timeslots of many newdles at once.
+
+        This avoids loading the participants of each newdle (or querying
+        their taken slots one by one) when serializing many newdles.
+        """
+        taken = Newdle.get_taken_timeslots(newdles)
+        for newdle in newdles:
+            if newdle.id in taken:
+                newdle._taken_timeslots = taken[newdle.id]
+
+    @staticmethod
+    def get_participant_counts(newdles):
+        """Count the participants of many newdles at once.
+
+        :return: a dict mapping the id of each newdle to a tuple containing
+                 its number of participants and how many of them answered
+        """
+        counts = {newdle.id: (0, 0) for newdle in newdles}
+        if not counts:
+            return counts
+        query = (
+            db.session.query(
+                Participant.newdle_id,
+                db.func.count(),
+                db.func.count().filter(Participant._answers.any()),
+            )
+            .filter(Participant.newdle_id.in_(counts))
+            .group_by(Participant.newdle_id)
+        )
+        for newdle_id, num_participants, num_answered in query:
+            counts[newdle_id] = (num_participants, num_answered)
+        return counts
+
+    def sync_slot_claims(self):
+        """Rebuild the slot claims of the newdle from its participants' answers.
+
+        This is needed when enabling or disabling limited slots. If several
+        participants already answered 'available' for the same timeslot,
+        only one of them gets it.
+        """
+        SlotClaim.query.filter_by(newdle_id=self.id).delete()
+        if not self.limited_slots:
+            return
+        claims = (
+            db.select(Participant.newdle_id, Answer.timeslot, Participant.id)
+            .join(Answer.participant)
+            .where(
+                Participant.newdle_id == self.id,
+                Answer.timeslot.in_(self.timeslots),
+                Answer.availability == Availability.available,
+            )
+        )
+        db.session.execute(
+            insert(SlotClaim)
+            .from_select(['newdle_id', 'timeslot', 'participant_id'], claims)
+            .on_conflict_do_nothing()
+        )
+
+    def delete_stale_slot_claims(self):
+        """Delete the slot claims of timeslots the newdle no longer has.
+
+        This is needed when timeslots are removed, since the participant
+        who claimed such a slot should be able to claim another one.
+        """
+        SlotClaim.query.filter(
+            SlotClaim.newdle_id == self.id, ~SlotClaim.timeslot.in_(self.timeslots)
+        ).delete(synchronize_session=False)
+
+    def get_answer_counts(self):
+        """Count the positive answers for each timeslot.
+
+        The counting is done in the database, so it does not require loading
+        the participants and their answers.
+
+        :return: a dict mapping each timeslot to a dict containing the
+                 number of ``available`` and ``ifneedbe`` answers
+        """
+        positive = (Availability.available, Availability.ifneedbe)
+        query = (
+            db.session.query(Answer.timeslot, Answer.availability, db.func.count())
+            .join(Answer.participant)
+            .filter(Participant.newdle_id == self.id, Answer.availability.in_(positive))
+            .group_by(Answer.timeslot, Answer.availability)
+        )
+        counts = {
+            slot: {availability.name: 0 for availability in positive}
+            for slot in self.timeslots
+        }
+        for timeslot, availability, count in query:
+            # answers for timeslots which have been removed are still stored
+            if timeslot in counts:
+                counts[timeslot][availability.name] = count
+        return counts
+
     def __repr__(self):
         return '<Newdle {}{}: "{}">'.format(
             self.id, ' F' if self.final_dt else '', self.title
@@ -120,10 +247,12 @@ class Participant(db.Model):
     __tablename__ = 'participants'
     __table_args__ = (
         CheckConstraint('(email IS NULL) = (auth_uid IS NULL)', 'email_uid_null'),
+        # a user can participate in a newdle only once
+        db.Index(None, 'newdle_id', 'auth_uid', unique=True),
     )
 
     id = db.Column(db.Integer, primary_key=True)
-    auth_uid = db.Column(db.String, nullable=True)
+    auth_uid = db.Column(db.String, nullable=True, index=True)
     name = db.Column(db.String, nullable=False)
     email = db.Column(db.String, nullable=True)
     code = db.Column(
@@ -133,7 +262,6 @@ class Participant(db.Model):
         default=generate_random_participant_code,
         unique=True,
     )
-    _answers = db.Column('answers', JSONB, nullable=True, default={})
     comment = db.Column(
         'comment', db.String, nullable=False, default='', server_default=''
     )
@@ -142,18 +270,58 @@ class Participant(db.Model):
     )
 
     newdle = db.relationship('Newdle', lazy=True, back_populates='participants')
+    # the answers are needed almost every time participants are used, so
+    # they are always loaded together
+    _answers = db.relationship(
+        'Answer',
+        lazy='selectin',
+        collection_class=attribute_keyed_dict('timeslot'),
+        back_populates='participant',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+    )
 
-    @hybrid_property
+    @property
     def answers(self):
-        return {parse_dt(k): Availability[v] for k, v in sorted(self._answers.items())}
-
-    @answers.expression
-    def answers(cls):
-        return cls._answers
+        return {
+            timeslot: answer.availability
+            for timeslot, answer in sorted(self._answers.items())
+        }
 
     @answers.setter
     def answers(self, value):
-        self._answers = {format_dt(k): v.name for k, v in value.items()}
+        # only the answers which actually changed are written
+        for timeslot in self._answers.keys() - value.keys():
+            del self._answers[timeslot]
+        for timeslot, availability in value.items():
+            if (answer := self._answers.get(timeslot)) is None:
+                self._answers[timeslot] = Answer(
+                    timeslot=timeslot, availability=availability
+                )
+            elif answer.availability != availability:
+                answer.availability = availability
+
+    def claim_slot(self, timeslot):
+        """Take a timeslot of a newdle with limited slots.
+
+        Any timeslot previously taken by the participant is released. The
+        claims are protected by a unique constraint, so this is safe even
+        when other participants try to take the same slot concurrently.
+
+        :param timeslot: the timeslot to take, or ``None`` to only release
+                         the currently taken slot
+        :return: whether the slot could be taken, i.e. it had not been taken
+                 by someone else yet
+        """
+        SlotClaim.query.filter_by(participant_id=self.id).delete()
+        if timeslot is None:
+            return True
+        result = db.session.execute(
+            insert(SlotClaim)
+            .values(newdle_id=self.newdle_id, timeslot=timeslot, participant_id=self.id)
+            .on_conflict_do_nothing()
+        )
+        return bool(result.rowcount)
 
     def __repr__(self):
         return '<Participant {}: {}{}>'.format(
@@ -161,12 +329,79 @@ class Participant(db.Model):
         )
 
 
+class SlotClaim(db.Model):
+    """A timeslot taken by a participant of a newdle with limited slots."""
+
+    __tablename__ = 'slot_claims'
+
+    newdle_id = db.Column(
+        db.Integer,
+        db.ForeignKey('newdles.id', ondelete='CASCADE'),
+        primary_key=True,
+    )
+    timeslot = db.Column(db.DateTime(), primary_key=True)
+    participant_id = db.Column(
+        db.Integer,
+        db.ForeignKey('participants.id', ondelete='CASCADE'),
+        nullable=False,
+        index=True,
+        unique=True,
+    )
+
+    def __repr__(self):
+        timeslot = format_dt(self.timeslot)
+        return f'<SlotClaim {self.newdle_id}/{timeslot}: {self.participant_id}>'
+
+
 class Availability(AutoNameEnum):
     unavailable = auto()
     available = auto()
     ifneedbe = auto()
 
 
+# the characters used for each answer in the compact answer encoding
+_COMPACT_ANSWER_CODES = {
+    None: '0',
+    Availability.unavailable: '1',
+    Availability.available: '2',
+    Availability.ifneedbe: '3',
+}
+
+
+def encode_answers(answers, timeslots):
+    """Encode answers as a compact string.
+
+    The string contains one character for each timeslot, in the same
+    order as the timeslots: ``0`` if there is no answer for the timeslot,
+    otherwise ``1`` for unavailable, ``2`` for available and ``3`` for
+    if-need-be. Answers for other timeslots are ignored.
+
+    :param answers: a dict mapping timeslots to their availability
+    :param timeslots: the timeslots of the newdle
+    """
+    return ''.join(_COMPACT_ANSWER_CODES[answers.get(slot)] for slot in timeslots)
+
+
+class Answer(db.Model):
+    """The answer of a participant for one of the timeslots of a newdle."""
+
+    __tablename__ = 'answers'
+
+    participant_id = db.Column(
+        db.Integer,
+        db.ForeignKey('participants.id', ondelete='CASCADE'),
+        primary_key=True,
+    )
+    timeslot = db.Column(db.DateTime(), primary_key=True)
+    availability = db.Column(db.Enum(Availability, name='availability'), nullable=False)
+
+    participant = db.relationship('Participant', back_populates='_answers')
+
+    def __repr__(self):
+        timeslot = format_dt(self.timeslot)
+        return f'<Answer {self.participant_id}/{timeslot}: {self.availability.name}>'
+
+
 class StatKey(AutoNameEnum):
     newdles_created = auto()
     participants_created = auto()
@@ -1,4 +1,7 @@
+import threading
+import uuid
 from datetime import datetime, time, timedelta
+from time import monotonic
 
 import pytz
 from exchangelib import (
@@ -15,15 +18,37 @@ from exchangelib.errors import (
     ErrorNoFreeBusyAccess,
     ErrorProxyRequestProcessingFailed,
 )
+from exchangelib.properties import (
+    FreeBusyViewOptions,
+    MailboxData,
+    TimeWindow,
+    TimeZone,
+)
+from exchangelib.protocol import Protocol
+from exchangelib.services import GetUserAvailability
 from flask import current_app
 from oauthlib.oauth2.rfc6749.tokens import OAuth2Token
 from werkzeug.exceptions import ServiceUnavailable
 
+from newdle.core.cache import cache
 from newdle.core.util import find_overlap
 from newdle.providers.free_busy.util import get_msal_token
 
 TYPE_MAP = {'Busy': 'busy', 'Tentative': 'busy', 'OOF': 'busy'}
 
+# EWS does not accept more than 100 mailboxes in a single availability request
+MAX_MAILBOXES = 100
+# ...nor a time window longer than 42 days
+MAX_WINDOW_DAYS = 42
+
+# Errors which (probably) mean that a mailbox doesn't exist
+MAILBOX_ERRORS = (
+    ErrorProxyRequestProcessingFailed,
+    ErrorMailRecipientNotFound,
+    ErrorAddressSpaceNotFound,
+    ErrorNoFreeBusyAccess,
+)
+
 # These are deprecated North American timezones which are still in common use.
 # Exchange doesn't like them, so we have to map them to their standard names.
 # Mapping taken from https://en.wikipedia.org/wiki/List_of_tz_database_time_zones
@@ -43,6 +68,26 @@ NON_STANDARD_TZS = {
     'Canada/Pacific': 'America/Vancouver',
 }
 
+# The service account used to query free/busy data, along with the key
+# (server, account and credentials) it was created for and the OAuth token
+# it currently uses
+_service_account = None
+_service_account_lock = threading.Lock()
+
+# Metadata of the service account which is needed for every request but
+# (practically) never changes, along with the account it belongs to, the
+# version it was loaded for and when it expires
+_account_metadata = None
+_account_metadata_lock = threading.Lock()
+
+
+class _GetUserAvailability(GetUserAvailability):
+    # return errors for a single mailbox instead of failing the whole request
+    ERRORS_TO_CATCH_IN_RESPONSE = (
+        *GetUserAvailability.ERRORS_TO_CATCH_IN_RESPONSE,
+        *MAILBOX_ERRORS,
+    )
+
 
 class MSALCredentials(OAuth2AuthorizationCodeCredentials):
     def refresh(self, session):
@@ -59,7 +104,14 @@ def get_token_from_msal():
     return token
 
 
-def fetch_free_busy(date, tz, uid, email):
+def _get_service_account():
+    """Get the Exchange account used to query free/busy data.
+
+    The account is kept for the whole lifetime of the process so its protocol
+    (and thus the HTTP connections to the Exchange server) can be reused. When
+    the OAuth token changes, only the credentials of the protocol are updated.
+    """
+    global _service_account
     acc = current_app.config['EXCHANGE_PROVIDER_ACCOUNT']
     creds = current_app.config['EXCHANGE_PROVIDER_CREDENTIALS']
     server = current_app.config['EXCHANGE_PROVIDER_SERVER']
@@ -71,70 +123,217 @@ def fetch_free_busy(date, tz, uid, email):
 
     if creds and all(creds):
         # "legacy" auth
-        credentials = Credentials(*creds)
-        configuration = Configuration(
-            server=server, auth_type=NTLM, credentials=credentials
-        )
+        key = (server, acc, tuple(creds))
+        access_token = None
     else:
         # oauth
-        credentials = MSALCredentials(
-            access_token=OAuth2Token({'access_token': get_token_from_msal()})
+        key = (server, acc, None)
+        access_token = get_token_from_msal()
+
+    with _service_account_lock:
+        if _service_account is None or _service_account[0] != key:
+            account = _create_account(server, acc, creds, access_token)
+            _service_account = (key, access_token, account)
+            return account
+
+        _, current_token, account = _service_account
+        if access_token != current_token:
+            # this only closes the idle sessions; the ones used by other threads
+            # are renewed by exchangelib once they fail to authenticate
+            account.protocol.credentials = _make_msal_credentials(access_token)
+            _service_account = (key, access_token, account)
+        return account
+
+
+def _make_msal_credentials(access_token):
+    return MSALCredentials(access_token=OAuth2Token({'access_token': access_token}))
+
+
+def _create_account(server, acc, creds, access_token):
+    if access_token is None:
+        configuration = Configuration(
+            server=server, auth_type=NTLM, credentials=Credentials(*creds)
         )
+    else:
         configuration = Configuration(
-            server=server, auth_type=OAUTH2, credentials=credentials
+            server=server,
+            auth_type=OAUTH2,
+            credentials=_make_msal_credentials(access_token),
         )
+    account = Account(acc, config=configuration, autodiscover=False)
+    # exchangelib keeps its protocols in a global cache (keyed by credentials)
+    # but we keep a reference to the account ourselves; an account replaced
+    # after a config change can then be garbage-collected (and its connections
+    # closed) once no other thread is using it anymore
+    try:
+        del Protocol[configuration]
+    except KeyError:
+        pass
+    return account
+
+
+def _get_account_metadata(account):
+    """Get the metadata of the service account.
+
+    The metadata is cached for ``EXCHANGE_PROVIDER_METADATA_TTL`` seconds
+    and loaded again whenever the service account is recreated or
+    :func:`refresh_account_metadata` is called.
+    """
+    global _account_metadata
+    # the version is shared by all processes so the refresh can be
+    # triggered from the CLI
+    version = cache.get('exchange-metadata-version')
+    with _account_metadata_lock:
+        if _account_metadata is not None:
+            metadata_account, metadata_version, expires, metadata = _account_metadata
+            if (
+                metadata_account is account
+                and metadata_version == version
+                and monotonic() < expires
+            ):
+                return metadata
+        account_tz = account.default_timezone
+        metadata = {
+            'timezone': account_tz,
+            # the definition of the timezone is needed to query availability
+            'tz_definition': next(
+                iter(
+                    account.protocol.get_timezones(
+                        timezones=[account_tz], return_full_timezone_data=True
+                    )
+                )
+            ),
+        }
+        ttl = current_app.config['EXCHANGE_PROVIDER_METADATA_TTL']
+        _account_metadata = (account, version, monotonic() + ttl, metadata)
+        return metadata
+
+
+def refresh_account_metadata():
+    """Discard the cached metadata of the service account.
+
+    It will be loaded from the Exchange server again when it's needed.
+    """
+    cache.set('exchange-metadata-version', uuid.uuid4().hex, timeout=0)
 
-    uid_account = Account(acc, config=configuration, autodiscover=False)
-    accounts = [
-        (uid_account, 'Organizer', False),
-        (
-            Account(f'{uid}@{domain}', autodiscover=False, config=configuration),
-            'Optional',
-            False,
+
+def _get_free_busy_views(account, tz_definition, emails, start, end):
+    """Get the free/busy views of many mailboxes in a single request.
+
+    :return: a list with a ``FreeBusyView`` (or an exception in case
+             of an error) for each of the emails
+    """
+    protocol = account.protocol
+    mailbox_data = [
+        MailboxData(
+            email=account.primary_smtp_address,
+            attendee_type='Organizer',
+            exclude_conflicts=False,
+        ),
+        *(
+            MailboxData(email=email, attendee_type='Optional', exclude_conflicts=False)
+            for email in emails
         ),
     ]
+    views = _GetUserAvailability(protocol).call(
+        mailbox_data=mailbox_data,
+        timezone=TimeZone.from_server_timezone(
+            tz_definition=tz_definition, for_year=start.year
+        ),
+        free_busy_view_options=FreeBusyViewOptions(
+            time_window=TimeWindow(start=start, end=end),
+            merged_free_busy_interval=30,
+            requested_view='DetailedMerged',
+        ),
+    )
+    # the views are in the same order as the mailboxes, and the first one is
+    # the one of the organizer (i.e. our own account) which we do not need
+    return list(views)[1:]
+
+
+def _get_busy_ranges(view, dates, tzinfo, account_tz):
+    """Get the busy ranges of a free/busy view for each of the dates."""
+    results = {date: [] for date in dates}
+    if isinstance(view, Exception):
+        # mailbox (probably) doesn't exist
+        return results
+    if view.view_type != 'FreeBusyMerged':
+        return results
+    for event in view.calendar_events or []:
+        if event.busy_type not in {'Busy', 'Tentative', 'OOF'}:
+            continue
+        start_dt = _ews_to_dt(event.start).replace(tzinfo=account_tz)
+        end_dt = _ews_to_dt(event.end).replace(tzinfo=account_tz)
+        for date in dates:
+            if overlap := find_overlap(date, start_dt, end_dt, tzinfo):
+                start, end = overlap
+                results[date].append(
+                    ((start.hour, start.minute), (end.hour, end.minute))
+                )
+    return results
+
+
+def _get_windows(dates):
+    """Group dates into time windows which can be queried in one request."""
+    windows = []
+    for date in sorted(dates):
+        if windows and (date - windows[-1][0]).days < MAX_WINDOW_DAYS:
+            windows[-1].append(date)
+        else:
+            windows.append([date])
+    return windows
+
+
+def _fetch_views(account, tz_definition, emails, start, end):
+    try:
+        return _get_free_busy_views(account, tz_definition, emails, start, end)
+    except MAILBOX_ERRORS as exc:
+        if len(emails) == 1:
+            return [exc]
+        # we don't know which mailbox caused the error, so we query each
+        # of them on its own
+        return [
+            _fetch_views(account, tz_definition, [email], start, end)[0]
+            for email in emails
+        ]
+
+
+def fetch_free_busy_batch(dates, tz, users):
+    domain = current_app.config['EXCHANGE_DOMAIN']
+    account = _get_service_account()
+    metadata = _get_account_metadata(account)
 
     if tz in NON_STANDARD_TZS:
         tz = NON_STANDARD_TZS[tz]
 
     tzinfo = pytz.timezone(tz)
-    account_tz = uid_account.default_timezone
-    # query the Exchange service using the account's timezone
-    start = (
-        datetime.combine(date, time.min).replace(tzinfo=tzinfo).astimezone(account_tz)
-    )
-    end = start + timedelta(hours=24)
+    account_tz = metadata['timezone']
+    # our own account is always included as well
+    chunk_size = MAX_MAILBOXES - 1
+    chunks = [users[i : i + chunk_size] for i in range(0, len(users), chunk_size)]
+    results = {}
 
-    results = []
-
-    try:
-        info = uid_account.protocol.get_free_busy_info(
-            accounts=accounts, start=start, end=end
+    for window in _get_windows(dates):
+        # query the Exchange service using the account's timezone
+        start = tzinfo.localize(datetime.combine(window[0], time.min)).astimezone(
+            account_tz
         )
+        end = tzinfo.localize(
+            datetime.combine(window[-1] + timedelta(days=1), time.min)
+        ).astimezone(account_tz)
+        for chunk in chunks:
+            emails = [f'{uid}@{domain}' for uid, _ in chunk]
+            views = _fetch_views(account, metadata['tz_definition'], emails, start, end)
+            for (uid, _), view in zip(chunk, views, strict=True):
+                busy_ranges = _get_busy_ranges(view, window, tzinfo, account_tz)
+                for date, ranges in busy_ranges.items():
+                    results[(uid, date)] = ranges
 
-        for busy_info in info:
-            if busy_info.view_type == 'FreeBusyMerged':
-                for event in busy_info.calendar_events or []:
-                    overlap = find_overlap(
-                        date,
-                        _ews_to_dt(event.start).replace(tzinfo=account_tz),
-                        _ews_to_dt(event.end).replace(tzinfo=account_tz),
-                        tzinfo,
-                    )
-                    if event.busy_type in {'Busy', 'Tentative', 'OOF'} and overlap:
-                        results.append(overlap)
-    except (
-        ErrorProxyRequestProcessingFailed,
-        ErrorMailRecipientNotFound,
-        ErrorAddressSpaceNotFound,
-        ErrorNoFreeBusyAccess,
-    ):
-        # mailbox (probably) doesn't exist
-        return []
+    return results
 
-    return [
-        ((start.hour, start.minute), (end.hour, end.minute)) for start, end in results
-    ]
+
+def fetch_free_busy(date, tz, uid, email):
+    return fetch_free_busy_batch([date], tz, [(uid, email)])[(uid, date)]
 
 
 def _ews_to_dt(ews_dt):
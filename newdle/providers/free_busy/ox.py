@@ -1,26 +1,22 @@
 import math
-from datetime import datetime
+from bisect import bisect_right
+from datetime import datetime, time
+from operator import itemgetter
 
 import pytz
-import requests
 from flask import current_app
 from requests.models import HTTPBasicAuth
 
+from newdle.core.cache import cache
+from newdle.core.http_client import http_client
 from newdle.core.util import find_overlap
 
 
-def fetch_free_busy(date, tz, uid, email):
-    ox_url = current_app.config['OX_PROVIDER_URL']
-    ox_username = current_app.config['OX_PROVIDER_USERNAME']
-    ox_password = current_app.config['OX_PROVIDER_PASSWORD']
-    ox_context_id = current_app.config['OX_PROVIDER_CONTEXT_ID']
-    ox_max_weeks = current_app.config.get('OX_PROVIDER_MAX_WEEKS', 4)
+def _get_max_weeks():
+    return current_app.config.get('OX_PROVIDER_MAX_WEEKS', 4)
 
-    if not ox_url or not ox_username or not ox_password or not ox_context_id:
-        raise RuntimeError('OX provider not configured!')
-
-    user_name, server = email.split('@')
 
+def _is_in_window(date):
     # see how far into the future we have to fetch data
     weeks_to_fetch = math.ceil((date - datetime.now().date()).days / 7) or 1
     # OX gives free-busy data for exactly the number of weeks,
@@ -28,25 +24,39 @@ def fetch_free_busy(date, tz, uid, email):
     # To get the full day, we request an additional week.
     # https://github.com/indico/newdle/issues/365
     weeks_to_fetch += 1
+    return weeks_to_fetch <= _get_max_weeks()
+
 
-    if weeks_to_fetch > ox_max_weeks:
-        return []
+def _fetch_busy_intervals(email):
+    """Download the free/busy data of a user.
 
+    The data is fetched for the maximum number of weeks allowed so it can
+    be used for any date.
+
+    :return: a list of ``(start, end)`` tuples sorted by their start, or
+             ``None`` if the data could not be fetched
+    """
+    ox_url = current_app.config['OX_PROVIDER_URL']
+    ox_username = current_app.config['OX_PROVIDER_USERNAME']
+    ox_password = current_app.config['OX_PROVIDER_PASSWORD']
+    ox_context_id = current_app.config['OX_PROVIDER_CONTEXT_ID']
+
+    user_name, server = email.split('@')
     params = {
         'contextId': ox_context_id,
         'userName': user_name,
         'server': server,
-        'weeksIntoFuture': weeks_to_fetch,
+        'weeksIntoFuture': _get_max_weeks(),
     }
 
-    resp = requests.get(
+    resp = http_client.get(
         ox_url, params=params, auth=HTTPBasicAuth(ox_username, ox_password)
     )
 
     if not resp.ok:
-        return []
+        return None
 
-    busy_slots = []
+    intervals = []
 
     for line in resp.text.splitlines():
         # this includes BUSY, BUSY-UNAVAILABLE and BUSY-TENTATIVE
@@ -58,13 +68,68 @@ def fetch_free_busy(date, tz, uid, email):
                 )
             except IndexError:
                 continue
+            intervals.append((start_dt, end_dt))
+
+    return sorted(intervals)
+
 
-            overlap = find_overlap(date, start_dt, end_dt, pytz.timezone(tz))
+def _get_busy_intervals(email):
+    # the feed covers all dates we can query, so we keep it around for a
+    # short time instead of downloading it again for each of them
+    key = f'ox-free-busy/{email}'
+    intervals = cache.get(key)
+    if intervals is None:
+        intervals = _fetch_busy_intervals(email)
+        if intervals is None:
+            return []
+        cache.set(key, intervals, timeout=current_app.config['OX_PROVIDER_CACHE_TTL'])
+    return intervals
 
-            if overlap:
-                busy_slots.append(overlap)
+
+def _get_busy_slots(intervals, date, tzinfo):
+    day_start = tzinfo.localize(datetime.combine(date, time.min))
+    day_end = tzinfo.localize(datetime.combine(date, time.max))
+    # skip all intervals starting after the end of the day
+    candidates = intervals[: bisect_right(intervals, day_end, key=itemgetter(0))]
+    busy_slots = []
+
+    for start_dt, end_dt in candidates:
+        if end_dt <= day_start:
+            continue
+        overlap = find_overlap(date, start_dt, end_dt, tzinfo)
+
+        if overlap:
+            busy_slots.append(overlap)
 
     return [
         ((start.hour, start.minute), (end.hour, end.minute))
         for start, end in busy_slots
     ]
+
+
+def fetch_free_busy_batch(dates, tz, users):
+    ox_url = current_app.config['OX_PROVIDER_URL']
+    ox_username = current_app.config['OX_PROVIDER_USERNAME']
+    ox_password = current_app.config['OX_PROVIDER_PASSWORD']
+    ox_context_id = current_app.config['OX_PROVIDER_CONTEXT_ID']
+
+    if not ox_url or not ox_username or not ox_password or not ox_context_id:
+        raise RuntimeError('OX provider not configured!')
+
+    tzinfo = pytz.timezone(tz)
+    dates_in_window = [date for date in dates if _is_in_window(date)]
+    results = {(uid, date): [] for uid, _ in users for date in dates}
+
+    if not dates_in_window:
+        return results
+
+    for uid, email in users:
+        intervals = _get_busy_intervals(email)
+        for date in dates_in_window:
+            results[(uid, date)] = _get_busy_slots(intervals, date, tzinfo)
+
+    return results
+
+
+def fetch_free_busy(date, tz, uid, email):
+    return fetch_free_busy_batch([date], tz, [(uid, email)])[(uid, date)]
@@ -20,7 +20,7 @@ from newdle.core.util import (
     check_user_signature,
     sign_user,
 )
-from newdle.models import Availability
+from newdle.models import Availability, encode_answers
 
 
 class UserSchema(mm.Schema):
@@ -59,6 +59,11 @@ class UserSearchResultSchema(UserSchema):
         return data
 
 
+class BusyTimesUserSchema(mm.Schema):
+    uid = fields.String(required=True)
+    email = fields.String(required=True)
+
+
 class NewUnknownParticipantSchema(mm.Schema):
     name = fields.String(required=True)
 
@@ -148,6 +153,20 @@ class RestrictedParticipantSchema(ParticipantSchema):
         return data
 
 
+class CompactParticipantSchema(RestrictedParticipantSchema):
+    """Participant with answers encoded using :func:`.encode_answers`.
+
+    The timeslots of the newdle need to be passed in the ``timeslots``
+    context variable.
+    """
+
+    answers = fields.Function(
+        lambda participant, context: encode_answers(
+            participant.answers, context['timeslots']
+        )
+    )
+
+
 class UpdateParticipantSchema(mm.Schema):
     answers = fields.Mapping(
         fields.DateTime(format=DATETIME_FORMAT), EnumField(Availability)
@@ -210,6 +229,18 @@ class MyNewdleSchema(NewdleSchema):
         exclude = ('timeslots',)
 
 
+class MyNewdleSummarySchema(NewdleSchema):
+    participant_count = fields.Function(
+        lambda newdle, context: context['participant_counts'][newdle.id][0]
+    )
+    answered_count = fields.Function(
+        lambda newdle, context: context['participant_counts'][newdle.id][1]
+    )
+
+    class Meta:
+        exclude = ('timeslots', 'participants')
+
+
 class RestrictedNewdleSchema(NewdleSchema):
     class Meta:
         exclude = ('participants',)
@@ -72,6 +72,9 @@ def test_validate_answers_limited_slots(db_session, dummy_newdle):
     dummy_newdle.participants.add(john)
     dummy_newdle.participants.add(amy)
     dummy_newdle.update_lastmod()
+    db_session.flush()
+    john.claim_slot(dummy_newdle.timeslots[0])
+    amy.claim_slot(dummy_newdle.timeslots[1])
     db_session.commit()
 
     answers = {
@@ -1,16 +1,31 @@
+import base64
+import hashlib
+from contextlib import contextmanager
 from datetime import date, datetime, timedelta
 from operator import attrgetter, itemgetter
 from pathlib import Path
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
+import requests
 from flask import url_for
+from requests.structures import CaseInsensitiveDict
+from sqlalchemy.orm import Query
 from werkzeug.exceptions import Forbidden
 
 from newdle import api
 from newdle.core.auth import app_token_from_multipass
+from newdle.core.query_stats import QueryStats
 from newdle.core.util import avatar_payload_from_user_info, secure_serializer
-from newdle.models import Availability, Newdle, Participant, StatKey, Stats
+from newdle.models import (
+    Availability,
+    Newdle,
+    Participant,
+    SlotClaim,
+    StatKey,
+    Stats,
+)
+from newdle.providers.free_busy import random as random_provider
 
 
 def add_avatar(participant_data):
@@ -40,6 +55,21 @@ def mock_sign_user(mocker):
     )
 
 
+@contextmanager
+def assert_max_queries(max_count):
+    """Fail if the requests inside the block run more than `max_count` queries.
+
+    The queries are counted by the same :class:`QueryStats` which is used for
+    the per-request statistics, and it is yielded so tests can inspect it.
+    """
+    stats = QueryStats()
+    with patch('newdle.core.query_stats.QueryStats', return_value=stats):
+        yield stats
+    assert stats.count <= max_count, (
+        f'{stats}; slowest query: {stats.slowest_statement}'
+    )
+
+
 def make_test_auth(uid):
     mock_identity_info = Mock(
         identifier=uid,
@@ -63,6 +93,169 @@ def test_stats(flask_client):
     }
 
 
+def test_user_avatar_gravatar_unavailable(flask_client, mocker):
+    mocker.patch('newdle.api.http_client.get', side_effect=requests.ConnectTimeout)
+    payload = avatar_payload_from_user_info(
+        {'email': 'example@example.com', 'name': 'Guinea Pig'}
+    )
+    resp = flask_client.get(url_for('api.user_avatar', payload=payload))
+    assert resp.status_code == 200
+    assert resp.mimetype == 'image/svg+xml'
+    assert b'G\n  </text>' in resp.data
+
+
+def test_user_avatar_initials(flask_client):
+    payload = avatar_payload_from_user_info({'email': None, 'name': 'Guinea Pig'})
+    resp = flask_client.get(url_for('api.user_avatar', payload=payload, size=32))
+    assert resp.status_code == 200
+    assert resp.mimetype == 'image/svg+xml'
+    assert b'height="32"' in resp.data
+    assert resp.cache_control.max_age == 86400
+    etag, is_weak = resp.get_etag()
+    assert etag
+    assert not is_weak
+    resp = flask_client.get(
+        url_for('api.user_avatar', payload=payload, size=32),
+        headers={'If-None-Match': f'"{etag}"'},
+    )
+    assert resp.status_code == 304
+    # the etag depends on the size
+    resp = flask_client.get(url_for('api.user_avatar', payload=payload, size=64))
+    assert resp.get_etag()[0] != etag
+
+
+def test_user_avatar_gravatar_cached(flask_client, mocker):
+    upstream = Mock(
+        status_code=200,
+        content=b'avatar',
+        headers=CaseInsensitiveDict(
+            {
+                'Content-Type': 'image/png',
+                'Cache-Control': 'max-age=300',
+                'ETag': '"abc"',
+                'Set-Cookie': 'foo=bar',
+            }
+        ),
+    )
+    get = mocker.patch('newdle.avatars.http_client.get', return_value=upstream)
+    payload = avatar_payload_from_user_info(
+        {'email': 'example@example.com', 'name': 'Guinea Pig'}
+    )
+    resp = flask_client.get(url_for('api.user_avatar', payload=payload, size=32))
+    assert resp.status_code == 200
+    assert resp.mimetype == 'image/png'
+    assert resp.data == b'avatar'
+    assert resp.headers['ETag'] == '"abc"'
+    assert 'Set-Cookie' not in resp.headers
+    assert resp.cache_control.public
+    assert 0 < resp.cache_control.max_age <= 300
+    # the second request is served from the cache
+    resp = flask_client.get(url_for('api.user_avatar', payload=payload, size=32))
+    assert resp.status_code == 200
+    assert resp.data == b'avatar'
+    # as is a conditional one
+    resp = flask_client.get(
+        url_for('api.user_avatar', payload=payload, size=32),
+        headers={'If-None-Match': '"abc"'},
+    )
+    assert resp.status_code == 304
+    assert not resp.data
+    assert get.call_count == 1
+    # but a different size is not
+    flask_client.get(url_for('api.user_avatar', payload=payload, size=64))
+    assert get.call_count == 2
+
+
+@pytest.mark.parametrize('size', ('a', 'b', '0', '-1', '4096'))
+def test_user_avatar_invalid_size(flask_client, mocker, size):
+    get = mocker.patch(
+        'newdle.avatars.http_client.get', return_value=Mock(status_code=404)
+    )
+    payload = avatar_payload_from_user_info(
+        {'email': 'example@example.com', 'name': 'Guinea Pig'}
+    )
+    resp = flask_client.get(url_for('api.user_avatar', payload=payload, size=size))
+    assert resp.status_code == 200
+    assert get.call_args.args[0].endswith('?d=404')
+    # invalid sizes share the cache entry of the default size
+    flask_client.get(url_for('api.user_avatar', payload=payload))
+    get.assert_called_once()
+
+
+def test_user_avatar_no_gravatar_cached(flask_client, mocker):
+    get = mocker.patch(
+        'newdle.avatars.http_client.get', return_value=Mock(status_code=404)
+    )
+    payload = avatar_payload_from_user_info(
+        {'email': 'example@example.com', 'name': 'Guinea Pig'}
+    )
+    for __ in range(2):
+        resp = flask_client.get(url_for('api.user_avatar', payload=payload))
+        assert resp.status_code == 200
+        assert resp.mimetype == 'image/svg+xml'
+        assert resp.cache_control.max_age == 3600
+    get.assert_called_once()
+
+
+def test_user_avatar_gravatar_error_not_cached(flask_client, mocker):
+    get = mocker.patch(
+        'newdle.avatars.http_client.get', return_value=Mock(status_code=503)
+    )
+    payload = avatar_payload_from_user_info(
+        {'email': 'example@example.com', 'name': 'Guinea Pig'}
+    )
+    for __ in range(2):
+        resp = flask_client.get(url_for('api.user_avatar', payload=payload))
+        assert resp.mimetype == 'image/svg+xml'
+        # nor by the client
+        assert resp.cache_control.max_age == 0
+    assert get.call_count == 2
+
+
+def test_user_avatars(flask_client, mocker):
+    gravatar_hash = hashlib.md5(b'a@example.com').hexdigest()
+
+    def _get(url):
+        if url.startswith(f'https://gravatar.com/avatar/{gravatar_hash}?'):
+            return Mock(
+                status_code=200,
+                content=b'avatar',
+                headers=CaseInsensitiveDict({'Content-Type': 'image/png'}),
+            )
+        return Mock(status_code=404)
+
+    get = mocker.patch('newdle.avatars.http_client.get', side_effect=_get)
+    gravatar = avatar_payload_from_user_info({'email': 'a@example.com', 'name': 'A'})
+    no_gravatar = avatar_payload_from_user_info({'email': 'b@example.com', 'name': 'B'})
+    no_email = avatar_payload_from_user_info({'email': None, 'name': 'c'})
+    resp = flask_client.post(
+        url_for('api.user_avatars'),
+        json={
+            'payloads': [gravatar, no_gravatar, no_email, gravatar, 'invalid'],
+            'size': 32,
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.json.keys() == {gravatar, no_gravatar, no_email, 'invalid'}
+    assert resp.json[gravatar] == 'data:image/png;base64,YXZhdGFy'
+    assert resp.json['invalid'] is None
+    for payload, initial in ((no_gravatar, b'B'), (no_email, b'C')):
+        prefix, data = resp.json[payload].split(',')
+        assert prefix == 'data:image/svg+xml;base64'
+        svg = base64.b64decode(data)
+        assert b'height="32"' in svg
+        assert initial + b'\n  </text>' in svg
+    assert get.call_count == 2
+
+
+def test_user_avatars_too_many(flask_client):
+    resp = flask_client.post(
+        url_for('api.user_avatars'),
+        json={'payloads': ['x'] * (api.MAX_AVATAR_BATCH_SIZE + 1)},
+    )
+    assert resp.status_code == 422
+
+
 @pytest.mark.usefixtures('mock_sign_user')
 def test_me(flask_client, dummy_uid):
     resp = flask_client.get(url_for('api.me'), **make_test_auth(dummy_uid))
@@ -222,6 +415,33 @@ def test_create_newdle_participant_email_sending(flask_client, dummy_uid, mail_q
     assert resp.status_code == 200
 
 
+@pytest.mark.usefixtures('db_session', 'mock_sign_user')
+def test_create_newdle_duplicate_participant(flask_client, dummy_uid):
+    participant = {
+        'name': 'Guinea Pig',
+        'email': 'guineapig@example.com',
+        'auth_uid': 'guineapig',
+        'signature': '-',
+    }
+    resp = flask_client.post(
+        url_for('api.create_newdle'),
+        **make_test_auth(dummy_uid),
+        json={
+            'title': 'My Newdle',
+            'duration': 120,
+            'timezone': 'Europe/Zurich',
+            'timeslots': ['2019-09-11T13:00'],
+            'participants': [participant, participant],
+            'limited_slots': False,
+            'private': True,
+            'notify': True,
+        },
+    )
+    assert resp.status_code == 200
+    assert [p['auth_uid'] for p in resp.json['participants']] == ['guineapig']
+    assert Stats.get_value(StatKey.participants_created) == 1
+
+
 def test_get_busy_times(flask_client, dummy_uid, mocker):
     mocker.patch('newdle.api._get_busy_times', return_value={})
     query = {
@@ -377,6 +597,94 @@ def test_get_participant_busy_times(flask_client, dummy_uid, dummy_newdle, mocke
     api._get_busy_times.reset_mock()
 
 
+def test_get_busy_times_batch(flask_client, dummy_uid, mocker, override_config):
+    # otherwise the single endpoint would just return what the batch cached
+    override_config(FREE_BUSY_CACHE_TTL=0)
+    fetch_free_busy = mocker.spy(random_provider, 'fetch_free_busy')
+    users = [
+        {'uid': 'alice', 'email': 'alice@example.com'},
+        {'uid': 'bob', 'email': 'bob@example.com'},
+        {'uid': 'alice', 'email': 'alice@example.com'},
+    ]
+    data = {
+        'start_date': '2020-09-16',
+        'end_date': '2020-09-18',
+        'tz': 'Europe/Zurich',
+        'users': users,
+    }
+
+    resp = flask_client.post(url_for('api.get_busy_times_batch'), json=data)
+    assert resp.status_code == 401
+
+    resp = flask_client.post(
+        url_for('api.get_busy_times_batch'), **make_test_auth(dummy_uid), json=data
+    )
+    assert resp.status_code == 200
+    assert resp.json.keys() == {'alice', 'bob'}
+    # the batch results must be the same as the ones from the single endpoint
+    for user in users:
+        assert resp.json[user['uid']].keys() == {
+            '2020-09-16',
+            '2020-09-17',
+            '2020-09-18',
+        }
+        for date_str, busy_times in resp.json[user['uid']].items():
+            single_resp = flask_client.get(
+                url_for('api.get_busy_times'),
+                **make_test_auth(dummy_uid),
+                query_string={'date': date_str, 'tz': 'Europe/Zurich', **user},
+            )
+            assert single_resp.json == busy_times
+    # 6 for the batch (with the duplicate user removed), then 9 single ones
+    assert fetch_free_busy.call_count == 15
+
+
+def test_get_busy_times_incomplete(flask_client, dummy_uid, mocker):
+    mocker.patch(
+        'newdle.api.fetch_busy_times',
+        return_value=([((8, 0), (9, 0)), ((10, 0), (10, 0))], ['exchange', 'ox']),
+    )
+    resp = flask_client.get(
+        url_for('api.get_busy_times'),
+        **make_test_auth(dummy_uid),
+        query_string={
+            'date': '2020-09-16',
+            'tz': 'Europe/Zurich',
+            'uid': 'alice',
+            'email': 'alice@example.com',
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.json == [['08:00', '09:00']]
+    assert resp.headers['X-Newdle-Incomplete-Providers'] == 'exchange, ox'
+
+
+@pytest.mark.parametrize(
+    ('start_date', 'end_date', 'users', 'error_field'),
+    (
+        ('2020-09-16', '2020-09-15', [{'uid': 'a', 'email': 'a@a.a'}], 'end_date'),
+        ('2020-09-01', '2020-10-31', [{'uid': 'a', 'email': 'a@a.a'}], 'end_date'),
+        ('2020-09-16', '2020-09-16', [], 'users'),
+        ('2020-09-16', '2020-09-16', [{'uid': 'a'}], 'users'),
+    ),
+)
+def test_get_busy_times_batch_invalid(
+    flask_client, dummy_uid, start_date, end_date, users, error_field
+):
+    resp = flask_client.post(
+        url_for('api.get_busy_times_batch'),
+        **make_test_auth(dummy_uid),
+        json={
+            'start_date': start_date,
+            'end_date': end_date,
+            'tz': 'Europe/Zurich',
+            'users': users,
+        },
+    )
+    assert resp.status_code == 422
+    assert error_field in resp.json['messages']
+
+
 @pytest.mark.usefixtures('db_session')
 def test_create_newdle_participant_signing(flask_client, dummy_uid):
     resp = flask_client.post(
@@ -489,6 +797,88 @@ def test_get_my_newdles(flask_client, dummy_uid, dummy_newdle):
     ]
 
 
+def test_get_my_newdles_paginated(flask_client, dummy_uid, create_newdle):
+    final_dt = datetime(2019, 9, 11, 13, 0)
+    for id_ in (1, 2, 3):
+        create_newdle(id_, participants=set())
+    for id_ in (4, 5):
+        create_newdle(id_, participants=set(), final_dt=final_dt)
+    create_newdle(6, participants=set(), final_dt=final_dt + timedelta(hours=1))
+    pages = []
+    cursor = None
+    while True:
+        query = {'limit': 2}
+        if cursor is not None:
+            query['cursor'] = cursor
+        resp = flask_client.get(
+            url_for('api.get_my_newdles', **query), **make_test_auth(dummy_uid)
+        )
+        assert resp.status_code == 200
+        pages.append([newdle['id'] for newdle in resp.json])
+        cursor = resp.headers.get('X-Newdle-Next-Cursor')
+        if cursor is None:
+            break
+    assert pages == [[3, 2], [1, 6], [5, 4]]
+
+
+@pytest.mark.parametrize('cursor', ('foo', '1@foo', '@2019-09-11T13:00'))
+def test_get_my_newdles_invalid_cursor(flask_client, dummy_uid, cursor):
+    resp = flask_client.get(
+        url_for('api.get_my_newdles', cursor=cursor), **make_test_auth(dummy_uid)
+    )
+    assert resp.status_code == 422
+    assert resp.json == {
+        'error': 'invalid_args',
+        'messages': {'cursor': ['Invalid cursor']},
+    }
+
+
+def test_get_my_newdles_summary(flask_client, dummy_uid, dummy_newdle):
+    participant = next(p for p in dummy_newdle.participants if p.code == 'part1')
+    participant.answers = {datetime(2019, 9, 11, 13, 0): Availability.available}
+    resp = flask_client.get(
+        url_for('api.get_my_newdles', summary=True), **make_test_auth(dummy_uid)
+    )
+    assert resp.status_code == 200
+    assert len(resp.json) == 1
+    assert 'participants' not in resp.json[0]
+    assert 'timeslots' not in resp.json[0]
+    assert resp.json[0]['id'] == dummy_newdle.id
+    assert resp.json[0]['participant_count'] == 3
+    assert resp.json[0]['answered_count'] == 1
+
+
+@pytest.mark.parametrize(
+    ('endpoint', 'kwargs', 'max_queries'),
+    (
+        ('api.get_newdle', {'code': 'dummy'}, 2),
+        ('api.get_participants', {'code': 'dummy'}, 4),
+        ('api.get_participants', {'code': 'dummy', 'compact': True}, 4),
+        ('api.get_participant', {'code': 'dummy', 'participant_code': 'part1'}, 3),
+        ('api.get_answer_tally', {'code': 'dummy'}, 3),
+        ('api.get_my_newdles', {}, 3),
+        ('api.get_my_newdles', {'summary': True}, 2),
+    ),
+)
+def test_query_count(
+    flask_client, dummy_newdle, dummy_uid, db_session, endpoint, kwargs, max_queries
+):
+    for i in range(10):
+        dummy_newdle.participants.add(
+            Participant(
+                name=f'Participant {i}',
+                answers={datetime(2019, 9, 11, 13, 0): Availability.available},
+            )
+        )
+    db_session.flush()
+    db_session.expire_all()
+    with assert_max_queries(max_queries):
+        resp = flask_client.get(
+            url_for(endpoint, **kwargs), **make_test_auth(dummy_uid)
+        )
+    assert resp.status_code == 200
+
+
 @pytest.mark.usefixtures('dummy_newdle')
 def test_get_newdle_invalid(flask_client):
     assert Newdle.query.count()
@@ -531,6 +921,66 @@ def test_get_newdle(flask_client, dummy_newdle):
     }
 
 
+@pytest.mark.usefixtures('db_session')
+def test_get_newdle_conditional(flask_client, dummy_newdle, db_session, mocker):
+    url = url_for('api.get_newdle', code='dummy')
+    resp = flask_client.get(url)
+    assert resp.status_code == 200
+    etag = resp.headers['ETag']
+    assert resp.cache_control.no_cache
+
+    # the newdle is not serialized again if the client has the latest version
+    dump = mocker.spy(api.RestrictedNewdleSchema, 'dump')
+    resp = flask_client.get(url, headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+    assert resp.headers['ETag'] == etag
+    assert not resp.data
+    dump.assert_not_called()
+
+    dummy_newdle.update_lastmod()
+    db_session.flush()
+    resp = flask_client.get(url, headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+    etag = resp.headers['ETag']
+
+    # deleting a newdle does not touch last_update but changes the response
+    dummy_newdle.deleted = True
+    db_session.flush()
+    resp = flask_client.get(url, headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.json['deleted']
+
+
+@pytest.mark.usefixtures('db_session')
+def test_get_participants_conditional(flask_client, dummy_newdle, dummy_uid):
+    url = url_for('api.get_participants', code='dummy')
+    resp = flask_client.get(url, **make_test_auth(dummy_uid))
+    etag = resp.headers['ETag']
+    headers = {**make_test_auth(dummy_uid)['headers'], 'If-None-Match': etag}
+    resp = flask_client.get(url, headers=headers)
+    assert resp.status_code == 304
+
+    # the compact version is a different representation
+    compact_url = url_for('api.get_participants', code='dummy', compact=True)
+    resp = flask_client.get(compact_url, headers=headers)
+    assert resp.status_code == 200
+
+    # access checks still apply
+    resp = flask_client.get(
+        url, headers={**make_test_auth('someone')['headers'], 'If-None-Match': etag}
+    )
+    assert resp.status_code == 403
+
+    flask_client.patch(
+        url_for('api.update_participant', code='dummy', participant_code='part1'),
+        json={'answers': {'2019-09-11T13:00': 'available'}},
+    )
+    resp = flask_client.get(url, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+
+
 @pytest.mark.usefixtures('db_session')
 def test_update_invalid_newdle(flask_client, dummy_uid):
     resp = flask_client.patch(
@@ -691,6 +1141,37 @@ def test_update_newdle_participants(flask_client, dummy_newdle, dummy_uid):
     assert Stats.get_value(StatKey.participants_created) == 2
 
 
+@pytest.mark.usefixtures('mock_sign_user')
+def test_update_newdle_participants_no_duplicate(flask_client, dummy_newdle, dummy_uid):
+    pig = next(p for p in dummy_newdle.participants if p.code == 'part3')
+    new_pig = {
+        'name': 'Guinea Pig',
+        'email': 'example@example.com',
+        'auth_uid': 'pig',
+        'signature': '-',
+    }
+    new_user = {**new_pig, 'name': 'Someone', 'auth_uid': 'someone'}
+    resp = flask_client.patch(
+        url_for('api.update_newdle', code='dummy'),
+        **make_test_auth(dummy_uid),
+        json={
+            'participants': [
+                {'id': pig.id, 'name': pig.name},
+                new_pig,
+                new_user,
+                new_user,
+            ]
+        },
+    )
+    assert resp.status_code == 200
+    assert sorted(p['auth_uid'] for p in resp.json['participants']) == [
+        'pig',
+        'someone',
+    ]
+    assert pig in dummy_newdle.participants
+    assert Stats.get_value(StatKey.participants_created) == 1
+
+
 def test_update_participant_limited_slots(db_session, flask_client, dummy_newdle):
     dummy_newdle.limited_slots = True
 
@@ -742,6 +1223,46 @@ def test_update_participant_limited_slots(db_session, flask_client, dummy_newdle
     ]
 
 
+def test_update_newdle_removed_timeslot_claims(
+    db_session, flask_client, dummy_newdle, dummy_uid
+):
+    dummy_newdle.limited_slots = True
+    resp = flask_client.patch(
+        url_for('api.update_participant', code='dummy', participant_code='part1'),
+        json={'answers': {'2019-09-11T13:00': 'available'}},
+    )
+    assert resp.status_code == 200
+    assert SlotClaim.query.count() == 1
+
+    timeslots = ['2019-09-11T14:00', '2019-09-12T13:00', '2019-09-12T13:30']
+    resp = flask_client.patch(
+        url_for('api.update_newdle', code='dummy'),
+        **make_test_auth(dummy_uid),
+        json={'timeslots': timeslots},
+    )
+    assert resp.status_code == 200
+    assert not SlotClaim.query.count()
+
+    # so the participant can take another slot
+    resp = flask_client.patch(
+        url_for('api.update_participant', code='dummy', participant_code='part1'),
+        json={'answers': {'2019-09-12T13:00': 'available'}},
+    )
+    assert resp.status_code == 200
+    # and the slot is free again when it is added back
+    resp = flask_client.patch(
+        url_for('api.update_newdle', code='dummy'),
+        **make_test_auth(dummy_uid),
+        json={'timeslots': ['2019-09-11T13:00', *timeslots]},
+    )
+    assert resp.status_code == 200
+    assert resp.json['available_timeslots'] == [
+        '2019-09-11T13:00',
+        '2019-09-11T14:00',
+        '2019-09-12T13:30',
+    ]
+
+
 def test_update_participant_limited_slots_multiple(
     db_session, flask_client, dummy_newdle
 ):
@@ -852,6 +1373,21 @@ def test_update_newdle_changes_last_update(flask_client, dummy_uid, dummy_newdle
     assert before_update < dummy_newdle.last_update
 
 
+@pytest.mark.usefixtures('db_session')
+def test_update_newdle_participants_changes_last_update(
+    flask_client, dummy_uid, dummy_newdle
+):
+    before_update = dummy_newdle.last_update
+    participant = next(p for p in dummy_newdle.participants if p.code == 'part1')
+    flask_client.patch(
+        url_for('api.update_newdle', code='dummy'),
+        **make_test_auth(dummy_uid),
+        json={'participants': [{'id': participant.id, 'name': participant.name}]},
+    )
+    assert dummy_newdle.participants == {participant}
+    assert before_update < dummy_newdle.last_update
+
+
 @pytest.mark.usefixtures('db_session')
 def test_update_participants_changes_last_update(flask_client, dummy_newdle):
     before_update = dummy_newdle.last_update
@@ -950,6 +1486,125 @@ def test_newdles_participating(flask_client, dummy_newdle, dummy_participant_uid
     ]
 
 
+def test_newdles_participating_paginated(
+    flask_client, create_newdle, dummy_participant_uid
+):
+    for id_ in range(1, 6):
+        create_newdle(id_)
+    pages = []
+    cursor = None
+    while True:
+        query = {'limit': 2}
+        if cursor is not None:
+            query['cursor'] = cursor
+        resp = flask_client.get(
+            url_for('api.get_newdles_participating', **query),
+            **make_test_auth(dummy_participant_uid),
+        )
+        assert resp.status_code == 200
+        pages.append([p['newdle']['id'] for p in resp.json])
+        cursor = resp.headers.get('X-Newdle-Next-Cursor')
+        if cursor is None:
+            break
+    assert pages == [[5, 4], [3, 2], [1]]
+
+
+def test_newdles_participating_query_count(
+    flask_client, create_newdle, db_session, dummy_participant_uid
+):
+    def _count_queries():
+        db_session.expire_all()
+        with assert_max_queries(5) as stats:
+            resp = flask_client.get(
+                url_for('api.get_newdles_participating'),
+                **make_test_auth(dummy_participant_uid),
+            )
+        assert resp.status_code == 200
+        return len(resp.json), stats.count
+
+    create_newdle(1, limited_slots=True)
+    create_newdle(2)
+    num_newdles, num_queries = _count_queries()
+    assert num_newdles == 2
+    for id_ in range(3, 9):
+        create_newdle(id_, limited_slots=bool(id_ % 2))
+    assert _count_queries() == (8, num_queries)
+
+
+@pytest.mark.usefixtures('db_session')
+def test_get_participants_compact(flask_client, dummy_newdle, dummy_uid):
+    participant = next(p for p in dummy_newdle.participants if p.code == 'part3')
+    participant.answers = {
+        datetime(2019, 9, 11, 14, 0): Availability.available,
+        datetime(2019, 9, 12, 13, 30): Availability.ifneedbe,
+    }
+    resp = flask_client.get(
+        url_for('api.get_participants', code='dummy', compact=True),
+        **make_test_auth(dummy_uid),
+    )
+    assert resp.status_code == 200
+    assert resp.json['timeslots'] == [
+        '2019-09-11T13:00',
+        '2019-09-11T14:00',
+        '2019-09-12T13:00',
+        '2019-09-12T13:30',
+    ]
+    participants = {p['name']: p for p in resp.json['participants']}
+    assert participants.keys() == {'Tony Stark', 'Albert Einstein', 'Guinea Pig'}
+    assert participants['Guinea Pig']['answers'] == '0203'
+    assert participants['Guinea Pig']['signature']
+    assert participants['Tony Stark']['answers'] == '0000'
+
+
+@pytest.mark.usefixtures('db_session')
+def test_get_answer_tally(flask_client, dummy_newdle, dummy_uid, db_session):
+    part1, part2, part3 = sorted(dummy_newdle.participants, key=attrgetter('code'))
+    part1.answers = {
+        datetime(2019, 9, 11, 13, 0): Availability.available,
+        datetime(2019, 9, 11, 14, 0): Availability.ifneedbe,
+        datetime(2019, 9, 12, 13, 0): Availability.unavailable,
+        # no longer a timeslot of the newdle
+        datetime(2019, 9, 13, 13, 0): Availability.available,
+    }
+    part2.answers = {
+        datetime(2019, 9, 11, 13, 0): Availability.available,
+        datetime(2019, 9, 11, 14, 0): Availability.available,
+    }
+    part3.answers = {datetime(2019, 9, 11, 13, 0): Availability.ifneedbe}
+    db_session.flush()
+
+    url = url_for('api.get_answer_tally', code='dummy')
+    resp = flask_client.get(url, **make_test_auth(dummy_uid))
+    assert resp.status_code == 200
+    assert resp.json == {
+        '2019-09-11T13:00': {'available': 2, 'ifneedbe': 1},
+        '2019-09-11T14:00': {'available': 1, 'ifneedbe': 1},
+        '2019-09-12T13:00': {'available': 0, 'ifneedbe': 0},
+        '2019-09-12T13:30': {'available': 0, 'ifneedbe': 0},
+    }
+    etag = resp.headers['ETag']
+
+    # nothing changed, so the tally does not need to be sent again
+    headers = {**make_test_auth(dummy_uid)['headers'], 'If-None-Match': etag}
+    resp = flask_client.get(url, headers=headers)
+    assert resp.status_code == 304
+    assert resp.headers['ETag'] == etag
+
+    dummy_newdle.last_update += timedelta(seconds=1)
+    db_session.flush()
+    resp = flask_client.get(url, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+
+
+@pytest.mark.usefixtures('db_session')
+def test_get_answer_tally_unauthorized(flask_client, dummy_newdle):
+    resp = flask_client.get(
+        url_for('api.get_answer_tally', code='dummy'), **make_test_auth('someone')
+    )
+    assert resp.status_code == 403
+
+
 @pytest.mark.usefixtures('db_session')
 def test_get_participants_unauthorized(flask_client, dummy_newdle):
     resp = flask_client.get(
@@ -1070,6 +1725,24 @@ def test_get_participant(flask_client, dummy_newdle):
     )
 
 
+@pytest.mark.usefixtures('db_session')
+def test_get_participant_conditional(flask_client, dummy_newdle):
+    url = url_for('api.get_participant', code='dummy', participant_code='part1')
+    etag = flask_client.get(url).headers['ETag']
+    resp = flask_client.get(url, headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+
+    # another participant of the same newdle has a different etag
+    other_url = url_for('api.get_participant', code='dummy', participant_code='part2')
+    resp = flask_client.get(other_url, headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+
+    flask_client.patch(url, json={'comment': 'hello'})
+    resp = flask_client.get(url, headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.json['comment'] == 'hello'
+
+
 @pytest.mark.usefixtures('dummy_newdle')
 def test_update_participant_empty(flask_client, dummy_newdle):
     resp = flask_client.patch(
@@ -1241,6 +1914,30 @@ def test_create_participant_newdle_no_duplicate(flask_client, dummy_newdle, dumm
     assert Stats.get_value(StatKey.participants_created) == 0  # no participants added
 
 
+def test_create_participant_concurrent(
+    flask_client, dummy_newdle, dummy_participant_uid, mocker
+):
+    # simulate the participant being created by another request right after
+    # we checked whether it already exists
+    orig_first = Query.first
+
+    def _first(self):
+        if self.column_descriptions[0]['entity'] is Participant:
+            return None
+        return orig_first(self)
+
+    mocker.patch.object(Query, 'first', _first)
+    nb_participant = Participant.query.count()
+    resp = flask_client.put(
+        url_for('api.create_participant', code='dummy'),
+        **make_test_auth(dummy_participant_uid),
+    )
+    assert resp.status_code == 200
+    assert resp.json['code'] == 'part3'
+    assert Participant.query.count() == nb_participant
+    assert Stats.get_value(StatKey.participants_created) == 0
+
+
 @pytest.mark.usefixtures('dummy_newdle')
 def test_create_participant(flask_client, dummy_newdle, dummy_uid):
     assert (
@@ -2,7 +2,11 @@ from datetime import datetime, timedelta
 
 from flask import current_app
 
-from newdle.cli import cleanup_newdles
+from newdle.cli import (
+    cleanup_newdles,
+    clear_free_busy_cache,
+    refresh_exchange_metadata,
+)
 from newdle.core.db import db
 from newdle.models import Newdle
 
@@ -120,3 +124,42 @@ def test_cleanup_newdles_multiple_entries_final_task(
     cli_runner.invoke(cleanup_newdles, [])
 
     assert Newdle.query.count() == 2
+
+
+def test_clear_free_busy_cache(cli_runner, mocker):
+    mocker.patch('newdle.cli.is_shared_cache', return_value=True)
+    invalidate = mocker.patch('newdle.cli.invalidate_busy_times_cache')
+    result = cli_runner.invoke(clear_free_busy_cache, [])
+    assert result.exit_code == 0
+    invalidate.assert_called_once_with(None)
+    result = cli_runner.invoke(clear_free_busy_cache, ['--provider', 'exchange'])
+    assert result.exit_code == 0
+    invalidate.assert_called_with('exchange')
+
+
+def test_clear_free_busy_cache_not_shared(cli_runner, mocker):
+    # the tests use the `simple` cache, which only exists in this process
+    invalidate = mocker.patch('newdle.cli.invalidate_busy_times_cache')
+    result = cli_runner.invoke(clear_free_busy_cache, [])
+    assert result.exit_code == 1
+    assert 'Free/busy cache cleared' not in result.output
+    invalidate.assert_not_called()
+
+
+def test_refresh_exchange_metadata(cli_runner, mocker):
+    mocker.patch('newdle.cli.is_shared_cache', return_value=True)
+    refresh = mocker.patch(
+        'newdle.providers.free_busy.exchange.refresh_account_metadata'
+    )
+    result = cli_runner.invoke(refresh_exchange_metadata, [])
+    assert result.exit_code == 0
+    refresh.assert_called_once_with()
+
+
+def test_refresh_exchange_metadata_not_shared(cli_runner, mocker):
+    refresh = mocker.patch(
+        'newdle.providers.free_busy.exchange.refresh_account_metadata'
+    )
+    result = cli_runner.invoke(refresh_exchange_metadata, [])
+    assert result.exit_code == 1
+    refresh.assert_not_called()
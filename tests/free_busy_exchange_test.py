@@ -0,0 +1,259 @@
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import pytz
+from exchangelib.errors import ErrorMailRecipientNotFound
+from exchangelib.protocol import Protocol
+
+from newdle.providers.free_busy.exchange import (
+    _fetch_views,
+    _get_account_metadata,
+    _get_busy_ranges,
+    _get_service_account,
+    _get_windows,
+    fetch_free_busy_batch,
+    refresh_account_metadata,
+)
+
+
+@pytest.fixture
+def configure_exchange(override_config, mocker):
+    override_config(
+        EXCHANGE_DOMAIN='example.com',
+        EXCHANGE_PROVIDER_SERVER='exchange.example.com',
+        EXCHANGE_PROVIDER_ACCOUNT='newdle@example.com',
+        EXCHANGE_PROVIDER_CREDENTIALS=None,
+        EXCHANGE_PROVIDER_CLIENT_ID='client-id',
+    )
+    mocker.patch('newdle.providers.free_busy.exchange._service_account', None)
+    # the real account would ask the server for its version
+    mocker.patch(
+        'newdle.providers.free_busy.exchange.Account',
+        side_effect=lambda acc, config, autodiscover: SimpleNamespace(
+            primary_smtp_address=acc, protocol=Protocol(config=config)
+        ),
+    )
+    return mocker.patch(
+        'newdle.providers.free_busy.exchange.get_token_from_msal',
+        return_value='token1',
+    )
+
+
+def _make_view(*events, view_type='FreeBusyMerged'):
+    return SimpleNamespace(
+        view_type=view_type,
+        calendar_events=[
+            SimpleNamespace(busy_type=busy_type, start=start, end=end)
+            for start, end, busy_type in events
+        ],
+    )
+
+
+def test_get_service_account_reused(configure_exchange):
+    account = _get_service_account()
+    assert account.primary_smtp_address == 'newdle@example.com'
+    assert account.protocol.credentials.access_token['access_token'] == 'token1'  # noqa: S105
+    assert _get_service_account() is account
+    # we keep the protocol ourselves, so it must not stay in exchangelib's cache
+    with pytest.raises(KeyError):
+        Protocol[account.protocol.config]
+
+
+def test_get_service_account_token_changed(configure_exchange, mocker):
+    account = _get_service_account()
+    protocol = account.protocol
+    close_session = mocker.spy(protocol, 'close_session')
+    # a session which is being used by another thread
+    session = protocol.get_session()
+    configure_exchange.return_value = 'token2'
+    assert _get_service_account() is account
+    assert account.protocol is protocol
+    assert protocol.credentials.access_token['access_token'] == 'token2'  # noqa: S105
+    close_session.assert_not_called()
+    protocol.release_session(session)
+
+
+def test_get_service_account_config_changed(configure_exchange, override_config):
+    account = _get_service_account()
+    override_config(EXCHANGE_PROVIDER_ACCOUNT='other@example.com')
+    new_account = _get_service_account()
+    assert new_account is not account
+    assert new_account.primary_smtp_address == 'other@example.com'
+    assert _get_service_account() is new_account
+
+
+@pytest.fixture
+def metadata_account(mocker, override_config):
+    override_config(EXCHANGE_PROVIDER_METADATA_TTL=60)
+    mocker.patch('newdle.providers.free_busy.exchange._account_metadata', None)
+    protocol = mocker.Mock()
+    protocol.get_timezones.side_effect = lambda timezones, **kwargs: iter(
+        [f'definition of {tz}' for tz in timezones]
+    )
+    return SimpleNamespace(default_timezone='UTC', protocol=protocol)
+
+
+def test_get_account_metadata_cached(metadata_account):
+    metadata = {'timezone': 'UTC', 'tz_definition': 'definition of UTC'}
+    assert _get_account_metadata(metadata_account) == metadata
+    assert _get_account_metadata(metadata_account) == metadata
+    metadata_account.protocol.get_timezones.assert_called_once()
+    # a new account needs its own metadata
+    other_account = SimpleNamespace(
+        default_timezone='UTC', protocol=metadata_account.protocol
+    )
+    _get_account_metadata(other_account)
+    assert metadata_account.protocol.get_timezones.call_count == 2
+
+
+def test_get_account_metadata_expired(metadata_account, mocker):
+    monotonic = mocker.patch(
+        'newdle.providers.free_busy.exchange.monotonic', return_value=1000
+    )
+    _get_account_metadata(metadata_account)
+    monotonic.return_value = 1059
+    _get_account_metadata(metadata_account)
+    assert metadata_account.protocol.get_timezones.call_count == 1
+    monotonic.return_value = 1060
+    _get_account_metadata(metadata_account)
+    assert metadata_account.protocol.get_timezones.call_count == 2
+
+
+def test_refresh_account_metadata(metadata_account):
+    _get_account_metadata(metadata_account)
+    refresh_account_metadata()
+    _get_account_metadata(metadata_account)
+    _get_account_metadata(metadata_account)
+    assert metadata_account.protocol.get_timezones.call_count == 2
+
+
+def test_get_windows():
+    dates = [
+        date(2020, 9, 20),
+        date(2020, 9, 16),
+        date(2020, 10, 27),
+        date(2020, 10, 28),
+        date(2021, 1, 1),
+    ]
+    assert _get_windows(dates) == [
+        [date(2020, 9, 16), date(2020, 9, 20), date(2020, 10, 27)],
+        [date(2020, 10, 28)],
+        [date(2021, 1, 1)],
+    ]
+
+
+def test_get_busy_ranges():
+    view = _make_view(
+        (datetime(2020, 9, 16, 8), datetime(2020, 9, 16, 9), 'Busy'),
+        (datetime(2020, 9, 16, 10), datetime(2020, 9, 16, 11), 'Free'),
+        # spans several days
+        (datetime(2020, 9, 16, 22), datetime(2020, 9, 18, 2), 'OOF'),
+        (datetime(2020, 9, 18, 12), datetime(2020, 9, 18, 13), 'Tentative'),
+    )
+    dates = [date(2020, 9, 16), date(2020, 9, 17), date(2020, 9, 18)]
+    assert _get_busy_ranges(view, dates, pytz.utc, pytz.utc) == {
+        date(2020, 9, 16): [((8, 0), (9, 0)), ((22, 0), (23, 59))],
+        date(2020, 9, 17): [((0, 0), (23, 59))],
+        date(2020, 9, 18): [((0, 0), (2, 0)), ((12, 0), (13, 0))],
+    }
+
+
+def test_get_busy_ranges_timezone():
+    view = _make_view((datetime(2020, 9, 16, 22), datetime(2020, 9, 16, 23), 'Busy'))
+    dates = [date(2020, 9, 16), date(2020, 9, 17)]
+    tzinfo = pytz.timezone('Europe/Zurich')
+    assert _get_busy_ranges(view, dates, tzinfo, pytz.utc) == {
+        date(2020, 9, 16): [],
+        date(2020, 9, 17): [((0, 0), (1, 0))],
+    }
+
+
+@pytest.mark.parametrize(
+    'view',
+    (
+        ErrorMailRecipientNotFound('not found'),
+        _make_view(
+            (datetime(2020, 9, 16, 8), datetime(2020, 9, 16, 9), 'Busy'),
+            view_type='None',
+        ),
+    ),
+)
+def test_get_busy_ranges_no_data(view):
+    assert _get_busy_ranges(view, [date(2020, 9, 16)], pytz.utc, pytz.utc) == {
+        date(2020, 9, 16): []
+    }
+
+
+def test_fetch_views_mailbox_error(mocker):
+    def _get_free_busy_views(account, tz_definition, emails, start, end):
+        if 'missing@example.com' in emails:
+            raise ErrorMailRecipientNotFound('not found')
+        return [f'view of {email}' for email in emails]
+
+    get_views = mocker.patch(
+        'newdle.providers.free_busy.exchange._get_free_busy_views',
+        side_effect=_get_free_busy_views,
+    )
+    emails = ['alice@example.com', 'missing@example.com', 'bob@example.com']
+    views = _fetch_views(None, None, emails, None, None)
+    assert views[0] == 'view of alice@example.com'
+    assert isinstance(views[1], ErrorMailRecipientNotFound)
+    assert views[2] == 'view of bob@example.com'
+    # one failed request with all mailboxes, then one for each of them
+    assert [call.args[2] for call in get_views.call_args_list] == [
+        emails,
+        *([email] for email in emails),
+    ]
+
+
+def test_fetch_views_no_error(mocker):
+    get_views = mocker.patch(
+        'newdle.providers.free_busy.exchange._get_free_busy_views',
+        return_value=['view 1', 'view 2'],
+    )
+    assert _fetch_views(None, None, ['a', 'b'], None, None) == ['view 1', 'view 2']
+    get_views.assert_called_once()
+
+
+def test_fetch_free_busy_batch(mocker, override_config):
+    override_config(EXCHANGE_DOMAIN='example.com')
+    mocker.patch('newdle.providers.free_busy.exchange._get_service_account')
+    mocker.patch(
+        'newdle.providers.free_busy.exchange._get_account_metadata',
+        return_value={'timezone': pytz.utc, 'tz_definition': None},
+    )
+
+    def _get_free_busy_views(account, tz_definition, emails, start, end):
+        # each user is busy for as many minutes as their number
+        return [
+            _make_view(
+                (
+                    start.replace(tzinfo=None) + timedelta(hours=8),
+                    start.replace(tzinfo=None)
+                    + timedelta(hours=8, minutes=int(email.split('@')[0][4:])),
+                    'Busy',
+                )
+            )
+            for email in emails
+        ]
+
+    get_views = mocker.patch(
+        'newdle.providers.free_busy.exchange._get_free_busy_views',
+        side_effect=_get_free_busy_views,
+    )
+    users = [(f'user{i}', f'user{i}@example.com') for i in range(1, 151)]
+    dates = [date(2020, 9, 16), date(2020, 12, 1)]
+    results = fetch_free_busy_batch(dates, 'UTC', users)
+    # two windows with two chunks each, since our own account is always
+    # part of the request as well
+    assert [len(call.args[2]) for call in get_views.call_args_list] == [
+        99,
+        51,
+        99,
+        51,
+    ]
+    assert results.keys() == {(uid, day) for uid, _ in users for day in dates}
+    assert results[('user1', dates[0])] == [((8, 0), (8, 1))]
+    assert results[('user99', dates[1])] == [((8, 0), (9, 39))]
+    assert results[('user150', dates[0])] == [((8, 0), (10, 30))]
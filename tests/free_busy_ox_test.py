@@ -0,0 +1,144 @@
+from datetime import date, datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+import pytz
+
+from newdle.core.util import find_overlap
+from newdle.providers.free_busy.ox import (
+    _get_busy_intervals,
+    _get_busy_slots,
+    fetch_free_busy_batch,
+)
+
+UTC = pytz.utc
+
+
+def _utc(*args):
+    return UTC.localize(datetime(*args))
+
+
+def _make_feed(*intervals):
+    lines = ['BEGIN:VFREEBUSY']
+    for start_dt, end_dt in intervals:
+        start = start_dt.strftime('%Y%m%dT%H%M%SZ')
+        end = end_dt.strftime('%Y%m%dT%H%M%SZ')
+        lines.append(f'FREEBUSY;FBTYPE=BUSY:{start}/{end}')
+    lines += ['FREEBUSY;FBTYPE=FREE:20200916T000000Z/20200917T000000Z', 'END:VFREEBUSY']
+    return '\n'.join(lines)
+
+
+@pytest.fixture
+def configure_ox(override_config):
+    override_config(
+        OX_PROVIDER_URL='https://ox.example.com/freebusy',
+        OX_PROVIDER_USERNAME='newdle',
+        OX_PROVIDER_PASSWORD='secret',  # noqa: S106
+        OX_PROVIDER_CONTEXT_ID=1,
+        OX_PROVIDER_MAX_WEEKS=4,
+        OX_PROVIDER_CACHE_TTL=60,
+    )
+
+
+@pytest.fixture
+def mock_get(mocker):
+    return mocker.patch('newdle.providers.free_busy.ox.http_client.get')
+
+
+def test_get_busy_slots(mocker):
+    overlap = mocker.patch(
+        'newdle.providers.free_busy.ox.find_overlap', wraps=find_overlap
+    )
+    intervals = [
+        # ends before the day
+        (_utc(2020, 9, 15, 8), _utc(2020, 9, 15, 9)),
+        # starts the day before
+        (_utc(2020, 9, 15, 22), _utc(2020, 9, 16, 1)),
+        (_utc(2020, 9, 16, 8), _utc(2020, 9, 16, 9)),
+        # ends the day after
+        (_utc(2020, 9, 16, 23), _utc(2020, 9, 17, 2)),
+        # starts after the day
+        (_utc(2020, 9, 17, 8), _utc(2020, 9, 17, 9)),
+        (_utc(2020, 9, 18, 8), _utc(2020, 9, 18, 9)),
+    ]
+    assert _get_busy_slots(intervals, date(2020, 9, 16), UTC) == [
+        ((0, 0), (1, 0)),
+        ((8, 0), (9, 0)),
+        ((23, 0), (23, 59)),
+    ]
+    # intervals outside the day are skipped without checking their overlap
+    assert overlap.call_count == 3
+
+
+def test_get_busy_slots_timezone():
+    intervals = [
+        (_utc(2020, 9, 15, 22), _utc(2020, 9, 15, 23)),
+        (_utc(2020, 9, 16, 22), _utc(2020, 9, 16, 23)),
+    ]
+    tzinfo = pytz.timezone('Europe/Zurich')
+    assert _get_busy_slots(intervals, date(2020, 9, 16), tzinfo) == [
+        ((0, 0), (1, 0)),
+    ]
+
+
+@pytest.mark.usefixtures('configure_ox')
+def test_get_busy_intervals_cached(mock_get):
+    start_dt = _utc(2020, 9, 16, 8)
+    end_dt = _utc(2020, 9, 16, 9)
+    mock_get.return_value = Mock(ok=True, text=_make_feed((start_dt, end_dt)))
+    assert _get_busy_intervals('alice@example.com') == [(start_dt, end_dt)]
+    assert _get_busy_intervals('alice@example.com') == [(start_dt, end_dt)]
+    mock_get.assert_called_once()
+    assert mock_get.call_args.kwargs['params'] == {
+        'contextId': 1,
+        'userName': 'alice',
+        'server': 'example.com',
+        'weeksIntoFuture': 4,
+    }
+    _get_busy_intervals('bob@example.com')
+    assert mock_get.call_count == 2
+
+
+@pytest.mark.usefixtures('configure_ox')
+def test_get_busy_intervals_error_not_cached(mock_get):
+    mock_get.return_value = Mock(ok=False)
+    assert _get_busy_intervals('alice@example.com') == []
+    assert _get_busy_intervals('alice@example.com') == []
+    assert mock_get.call_count == 2
+
+
+@pytest.mark.usefixtures('configure_ox')
+def test_fetch_free_busy_batch(mock_get):
+    today = date.today()
+    dates = [today + timedelta(days=1), today + timedelta(days=2)]
+    feeds = {
+        'alice': _make_feed(
+            *(
+                (_utc(*day.timetuple()[:3], 8), _utc(*day.timetuple()[:3], 9))
+                for day in dates
+            )
+        ),
+        'bob': _make_feed(),
+    }
+    mock_get.side_effect = lambda url, params, auth: Mock(
+        ok=True, text=feeds[params['userName']]
+    )
+    # too far in the future to be covered by the feed
+    late_date = today + timedelta(weeks=5)
+    users = [('alice', 'alice@example.com'), ('bob', 'bob@example.com')]
+    assert fetch_free_busy_batch([*dates, late_date], 'UTC', users) == {
+        ('alice', dates[0]): [((8, 0), (9, 0))],
+        ('alice', dates[1]): [((8, 0), (9, 0))],
+        ('alice', late_date): [],
+        ('bob', dates[0]): [],
+        ('bob', dates[1]): [],
+        ('bob', late_date): [],
+    }
+    # one request per user, regardless of the number of dates
+    assert mock_get.call_count == 2
+
+
+@pytest.mark.usefixtures('app')
+def test_fetch_free_busy_batch_not_configured():
+    with pytest.raises(RuntimeError):
+        fetch_free_busy_batch([date.today()], 'UTC', [('alice', 'alice@example.com')])
@@ -0,0 +1,157 @@
+import threading
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from newdle.core.cache import cache
+from newdle.free_busy import (
+    fetch_busy_times,
+    fetch_busy_times_batch,
+    invalidate_busy_times_cache,
+)
+
+
+@pytest.fixture
+def mock_providers(mocker, override_config):
+    single = SimpleNamespace(
+        fetch_free_busy=mocker.Mock(
+            side_effect=lambda date, tz, uid, email: [((8, 0), (9, 0))]
+        )
+    )
+    batch = SimpleNamespace(
+        fetch_free_busy=mocker.Mock(),
+        fetch_free_busy_batch=mocker.Mock(
+            side_effect=lambda dates, tz, users: {
+                (uid, date): [((8, 30), (10, 0))] for uid, _ in users for date in dates
+            }
+        ),
+    )
+    providers = {'single': single, 'batch': batch}
+    mocker.patch('newdle.free_busy.get_provider', side_effect=providers.__getitem__)
+    override_config(FREE_BUSY_PROVIDERS=['single', 'batch'])
+    return providers
+
+
+def test_fetch_busy_times_batch(mock_providers):
+    dates = [date(2020, 9, 16), date(2020, 9, 17)]
+    users = [('alice', 'alice@example.com'), ('bob', 'bob@example.com')]
+    assert fetch_busy_times_batch(dates, 'Europe/Zurich', users) == (
+        {(uid, date): [((8, 0), (10, 0))] for uid, _ in users for date in dates},
+        [],
+    )
+    # providers without batch support are queried for each user and date
+    assert mock_providers['single'].fetch_free_busy.call_count == 4
+    # the others get everything at once
+    mock_providers['batch'].fetch_free_busy_batch.assert_called_once_with(
+        dates, 'Europe/Zurich', users
+    )
+    mock_providers['batch'].fetch_free_busy.assert_not_called()
+
+
+def test_fetch_busy_times(mock_providers):
+    assert fetch_busy_times(
+        date(2020, 9, 16), 'Europe/Zurich', 'alice', 'alice@example.com'
+    ) == ([((8, 0), (10, 0))], [])
+
+
+def test_fetch_busy_times_cached(mock_providers):
+    fetch_free_busy = mock_providers['single'].fetch_free_busy
+    fetch_free_busy_batch = mock_providers['batch'].fetch_free_busy_batch
+    dates = [date(2020, 9, 16), date(2020, 9, 17)]
+    users = [('alice', 'alice@example.com'), ('bob', 'bob@example.com')]
+    fetch_busy_times_batch(dates, 'Europe/Zurich', users)
+    assert fetch_free_busy.call_count == 4
+    assert fetch_free_busy_batch.call_count == 1
+
+    # everything is cached
+    fetch_busy_times_batch(dates, 'Europe/Zurich', users)
+    fetch_busy_times(dates[0], 'Europe/Zurich', 'bob', 'bob@example.com')
+    assert fetch_free_busy.call_count == 4
+    assert fetch_free_busy_batch.call_count == 1
+
+    # only the missing data is fetched
+    fetch_busy_times_batch(
+        [dates[1], date(2020, 9, 18)],
+        'Europe/Zurich',
+        [*users, ('carol', 'carol@example.com')],
+    )
+    assert fetch_free_busy.call_count == 10
+    fetch_free_busy_batch.assert_called_with(
+        [dates[1], date(2020, 9, 18)],
+        'Europe/Zurich',
+        [*users, ('carol', 'carol@example.com')],
+    )
+
+    # a different timezone is cached separately
+    fetch_busy_times(dates[0], 'US/Pacific', 'bob', 'bob@example.com')
+    assert fetch_free_busy.call_count == 11
+
+
+def test_fetch_busy_times_cached_per_email(mock_providers):
+    fetch_free_busy = mock_providers['single'].fetch_free_busy
+    fetch_free_busy.side_effect = lambda date, tz, uid, email: (
+        [((8, 0), (9, 0))] if email == 'bob@example.com' else []
+    )
+    mock_providers['batch'].fetch_free_busy_batch.side_effect = (
+        lambda dates, tz, users: {(uid, date): [] for uid, _ in users for date in dates}
+    )
+    day = date(2020, 9, 16)
+    # someone else's email with alice's uid must not end up in alice's cache
+    assert fetch_busy_times(day, 'Europe/Zurich', 'alice', 'bob@example.com') == (
+        [((8, 0), (9, 0))],
+        [],
+    )
+    assert fetch_busy_times(day, 'Europe/Zurich', 'alice', 'alice@example.com') == (
+        [],
+        [],
+    )
+    assert fetch_free_busy.call_count == 2
+
+
+def test_fetch_busy_times_cache_no_eviction(mock_providers):
+    # more entries than the threshold of the main cache
+    cache.set('exchange-token', 'token', timeout=0)
+    users = [(f'user{i}', f'user{i}@example.com') for i in range(600)]
+    fetch_busy_times_batch([date(2020, 9, 16)], 'Europe/Zurich', users)
+    assert cache.get('exchange-token') == 'token'
+    assert cache.get('free-busy-ns/single') is not None
+    assert cache.get('free-busy-ns/batch') is not None
+
+
+def test_fetch_busy_times_cache_disabled(mock_providers, override_config):
+    override_config(FREE_BUSY_CACHE_TTL=0)
+    fetch_busy_times(date(2020, 9, 16), 'Europe/Zurich', 'bob', 'bob@example.com')
+    fetch_busy_times(date(2020, 9, 16), 'Europe/Zurich', 'bob', 'bob@example.com')
+    assert mock_providers['single'].fetch_free_busy.call_count == 2
+    assert mock_providers['batch'].fetch_free_busy_batch.call_count == 2
+
+
+@pytest.mark.parametrize(
+    ('name', 'expected_calls'), (('single', (2, 1)), (None, (2, 2)))
+)
+def test_invalidate_busy_times_cache(mock_providers, name, expected_calls):
+    fetch_busy_times(date(2020, 9, 16), 'Europe/Zurich', 'bob', 'bob@example.com')
+    invalidate_busy_times_cache(name)
+    fetch_busy_times(date(2020, 9, 16), 'Europe/Zurich', 'bob', 'bob@example.com')
+    assert (
+        mock_providers['single'].fetch_free_busy.call_count,
+        mock_providers['batch'].fetch_free_busy_batch.call_count,
+    ) == expected_calls
+
+
+def test_fetch_busy_times_timeout(mocker, mock_providers, override_config):
+    release = threading.Event()
+
+    def _fetch_slow(date, tz, uid, email):
+        release.wait(5)
+        return [((12, 0), (13, 0))]
+
+    mock_providers['single'].fetch_free_busy.side_effect = _fetch_slow
+    override_config(FREE_BUSY_PROVIDER_TIMEOUTS={'single': 0.1})
+    try:
+        assert fetch_busy_times(
+            date(2020, 9, 16), 'Europe/Zurich', 'alice', 'alice@example.com'
+        ) == ([((8, 30), (10, 0))], ['single'])
+    finally:
+        release.set()
@@ -0,0 +1,63 @@
+import pytest
+import requests
+
+from newdle.core.http_client import http_client
+
+
+@pytest.fixture(autouse=True)
+def reset_http_client():
+    http_client.reset()
+    yield
+    http_client.reset()
+
+
+@pytest.fixture
+def mock_session_request(mocker):
+    return mocker.patch.object(
+        requests.Session,
+        'request',
+        return_value=mocker.Mock(status_code=200, raw=None),
+    )
+
+
+def test_shared_session():
+    assert http_client.session is http_client.session
+    adapter = http_client.session.get_adapter('https://example.com')
+    assert adapter.max_retries.total == 2
+    assert adapter.max_retries.read == 0
+    assert adapter.max_retries.status_forcelist == {502, 503, 504}
+
+
+def test_default_timeout(mock_session_request, override_config):
+    override_config(HTTP_CONNECT_TIMEOUT=1, HTTP_READ_TIMEOUT=2)
+    http_client.get('https://example.com/foo', params={'a': 'b'})
+    mock_session_request.assert_called_once_with(
+        'GET', 'https://example.com/foo', params={'a': 'b'}, timeout=(1, 2)
+    )
+    mock_session_request.reset_mock()
+    http_client.post('https://example.com/foo', data={'a': 'b'}, timeout=5)
+    mock_session_request.assert_called_once_with(
+        'POST', 'https://example.com/foo', data={'a': 'b'}, timeout=5
+    )
+
+
+def test_metrics(mocker, mock_session_request):
+    logger = mocker.patch('newdle.core.http_client.current_app.logger')
+    http_client.get('https://example.com/foo')
+    http_client.get('https://example.com/bar')
+    mock_session_request.return_value = mocker.Mock(status_code=503, raw=None)
+    http_client.get('https://example.org/foo')
+    mock_session_request.side_effect = requests.ConnectionError
+    with pytest.raises(requests.ConnectionError):
+        http_client.get('https://example.org/foo')
+
+    metrics = http_client.get_metrics()
+    assert metrics.keys() == {'example.com', 'example.org'}
+    assert metrics['example.com']['requests'] == 2
+    assert metrics['example.com']['errors'] == 0
+    assert metrics['example.org']['requests'] == 2
+    assert metrics['example.org']['errors'] == 2
+    # failed requests are logged along with the metrics of their host
+    assert logger.warning.call_count == 2
+    assert logger.warning.call_args.args[1] == 'example.org'
+    assert logger.warning.call_args.args[3] == metrics['example.org']
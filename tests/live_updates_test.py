@@ -0,0 +1,113 @@
+import json
+from itertools import islice
+
+import pytest
+from flask import url_for
+
+from newdle.core.db import db
+from newdle.live_updates import _listen, iter_newdle_updates
+
+
+@pytest.fixture
+def enable_live_updates(override_config):
+    override_config(
+        LIVE_UPDATES_ENABLED=True,
+        LIVE_UPDATES_KEEPALIVE=15,
+        LIVE_UPDATES_MAX_DURATION=300,
+        LIVE_UPDATES_RETRY_DELAY=5,
+    )
+
+
+@pytest.fixture
+def mock_listen(mocker):
+    def _mock_listen(*payloads):
+        listener = (payload for payload in payloads)
+        return mocker.patch('newdle.live_updates._listen', return_value=listener)
+
+    return _mock_listen
+
+
+@pytest.mark.usefixtures('app')
+def test_listen():
+    listener = _listen('newdle_test', 0.01)
+    assert next(listener) is None
+    # the listener must not use a connection from the pool
+    assert db.engine.pool.checkedout() == 0
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql("NOTIFY newdle_test, 'foo'")
+        conn.exec_driver_sql("NOTIFY newdle_test, 'bar'")
+    assert list(islice(listener, 2)) == ['foo', 'bar']
+    listener.close()
+
+
+@pytest.mark.usefixtures('app', 'enable_live_updates')
+def test_iter_newdle_updates(mock_listen):
+    listen = mock_listen(
+        json.dumps({'type': 'participant_created', 'participant': 123}), None
+    )
+    assert list(iter_newdle_updates(42)) == [
+        'retry: 5000\n\n',
+        'event: participant_created\ndata: {"participant": 123}\n\n',
+        ': keepalive\n\n',
+    ]
+    listen.assert_called_once_with('newdle_42', 15)
+
+
+@pytest.mark.usefixtures('app', 'enable_live_updates')
+def test_iter_newdle_updates_max_duration(mock_listen, override_config):
+    override_config(LIVE_UPDATES_MAX_DURATION=0)
+    mock_listen(None, None)
+    assert list(iter_newdle_updates(42)) == ['retry: 5000\n\n', ': keepalive\n\n']
+
+
+@pytest.mark.usefixtures('enable_live_updates')
+def test_get_newdle_updates(flask_client, dummy_newdle, mock_listen):
+    dummy_newdle.private = False
+    mock_listen(json.dumps({'type': 'newdle_deleted'}))
+    resp = flask_client.get(url_for('api.get_newdle_updates', code='dummy'))
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/event-stream'
+    assert resp.get_data(as_text=True) == (
+        'retry: 5000\n\nevent: newdle_deleted\ndata: {}\n\n'
+    )
+
+
+@pytest.mark.usefixtures('enable_live_updates')
+def test_get_newdle_updates_private(flask_client, dummy_newdle, mock_listen):
+    listen = mock_listen()
+    resp = flask_client.get(url_for('api.get_newdle_updates', code='dummy'))
+    assert resp.status_code == 403
+    listen.assert_not_called()
+
+
+@pytest.mark.usefixtures('db_session')
+def test_get_newdle_updates_disabled(flask_client, dummy_newdle):
+    resp = flask_client.get(url_for('api.get_newdle_updates', code='dummy'))
+    assert resp.status_code == 204
+
+
+@pytest.mark.usefixtures('enable_live_updates')
+def test_update_participant_publishes_update(flask_client, dummy_newdle, mocker):
+    execute = mocker.spy(db.session, 'execute')
+    participant = next(p for p in dummy_newdle.participants if p.code == 'part1')
+    flask_client.patch(
+        url_for('api.update_participant', code='dummy', participant_code='part1'),
+        json={'comment': 'hello'},
+    )
+    notifications = [
+        call.args[0].compile().params
+        for call in execute.call_args_list
+        if 'pg_notify' in str(call.args[0])
+    ]
+    assert [list(params.values()) for params in notifications] == [
+        [
+            f'newdle_{dummy_newdle.id}',
+            json.dumps(
+                {
+                    'type': 'participant_updated',
+                    'participant': participant.id,
+                    'fields': ['comment'],
+                }
+            ),
+        ]
+    ]
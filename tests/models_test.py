@@ -1,9 +1,20 @@
 from datetime import datetime, timedelta
+from operator import attrgetter
 
 import pytest
 from flask import current_app
+from sqlalchemy.exc import IntegrityError
 
-from newdle.models import Newdle, Participant, generate_random_newdle_code
+from newdle.core.db import db
+from newdle.models import (
+    Answer,
+    Availability,
+    Newdle,
+    Participant,
+    SlotClaim,
+    encode_answers,
+    generate_random_newdle_code,
+)
 
 
 def test_create_newdle(dummy_newdle):
@@ -98,3 +109,194 @@ def test_code_generation(db_session, monkeypatch):
 
     monkeypatch.setattr(_random, 'choices', mock_random)
     assert generate_random_newdle_code() == 'something else'
+
+
+def test_participant_answers(dummy_newdle, db_session):
+    slot1, slot2, slot3 = dummy_newdle.timeslots[:3]
+    participant = Participant(name='John Doe', newdle=dummy_newdle)
+    participant.answers = {
+        slot2: Availability.available,
+        slot1: Availability.ifneedbe,
+    }
+    db_session.add(participant)
+    db_session.flush()
+    first_answer = participant._answers[slot1]
+
+    participant.answers = {
+        slot1: Availability.ifneedbe,
+        slot3: Availability.unavailable,
+    }
+    # answers which did not change are kept as they are
+    assert participant._answers[slot1] is first_answer
+    assert not db_session.is_modified(first_answer)
+    db_session.flush()
+
+    db_session.expire(participant)
+    assert participant.answers == {
+        slot1: Availability.ifneedbe,
+        slot3: Availability.unavailable,
+    }
+    assert list(participant.answers) == [slot1, slot3]
+    assert {(a.participant_id, a.timeslot) for a in Answer.query} == {
+        (participant.id, slot1),
+        (participant.id, slot3),
+    }
+
+    # the answers are deleted along with the participant
+    dummy_newdle.participants.remove(participant)
+    db_session.flush()
+    assert not Answer.query.count()
+
+
+def test_get_taken_timeslots(create_newdle, db_session):
+    limited = create_newdle(1, limited_slots=True)
+    unlimited = create_newdle(2)
+    empty = create_newdle(3, limited_slots=True)
+    for newdle in (limited, unlimited):
+        (participant,) = newdle.participants
+        participant.answers = {
+            datetime(2019, 9, 11, 13, 0): Availability.available,
+            datetime(2019, 9, 11, 14, 0): Availability.unavailable,
+        }
+    db_session.flush()
+
+    assert Newdle.get_taken_timeslots([limited, unlimited, empty]) == {
+        limited.id: {datetime(2019, 9, 11, 13, 0)},
+        empty.id: set(),
+    }
+
+
+def test_available_timeslots(create_newdle, db_session, mocker):
+    newdle = create_newdle(limited_slots=True)
+    (participant,) = newdle.participants
+    participant.answers = {datetime(2019, 9, 11, 13, 0): Availability.available}
+    db_session.flush()
+    expected = [
+        datetime(2019, 9, 11, 14, 0),
+        datetime(2019, 9, 12, 13, 0),
+        datetime(2019, 9, 12, 13, 30),
+    ]
+    assert newdle.available_timeslots == expected
+
+    # without loaded participants the taken slots are queried directly
+    db_session.expire(newdle, ['participants'])
+    get_taken_timeslots = mocker.spy(Newdle, 'get_taken_timeslots')
+    assert newdle.available_timeslots == expected
+    assert 'participants' not in newdle.__dict__
+    get_taken_timeslots.assert_called_once_with([newdle])
+
+    # or preloaded for many newdles at once
+    Newdle.preload_available_timeslots([newdle])
+    assert newdle.available_timeslots == expected
+    assert get_taken_timeslots.call_count == 2
+
+
+def test_claim_slot(dummy_newdle, db_session):
+    dummy_newdle.limited_slots = True
+    part1, part2, part3 = sorted(dummy_newdle.participants, key=attrgetter('code'))
+    slot1, slot2 = dummy_newdle.timeslots[:2]
+
+    assert part1.claim_slot(slot1)
+    assert not part2.claim_slot(slot1)
+    assert part2.claim_slot(slot2)
+    # trying to take another slot releases the previous one
+    assert not part1.claim_slot(slot2)
+    assert part3.claim_slot(slot1)
+    assert part1.claim_slot(None)
+    assert {(c.timeslot, c.participant_id) for c in SlotClaim.query} == {
+        (slot1, part3.id),
+        (slot2, part2.id),
+    }
+
+    # deleting a participant releases their slot
+    dummy_newdle.participants.remove(part3)
+    db_session.flush()
+    assert {c.timeslot for c in SlotClaim.query} == {slot2}
+
+
+def test_sync_slot_claims(dummy_newdle, db_session):
+    part1, part2, part3 = sorted(dummy_newdle.participants, key=attrgetter('code'))
+    slot1, slot2 = dummy_newdle.timeslots[:2]
+    part1.answers = {slot1: Availability.available}
+    part2.answers = {slot1: Availability.available, slot2: Availability.unavailable}
+    part3.answers = {slot2: Availability.available}
+    db_session.flush()
+
+    dummy_newdle.sync_slot_claims()
+    assert not SlotClaim.query.count()
+
+    dummy_newdle.limited_slots = True
+    dummy_newdle.sync_slot_claims()
+    claims = {c.timeslot: c.participant_id for c in SlotClaim.query}
+    # only one of the participants who chose the same slot gets it
+    assert claims.keys() == {slot1, slot2}
+    assert claims[slot1] in {part1.id, part2.id}
+    assert claims[slot2] == part3.id
+
+    # answers for removed timeslots do not claim anything
+    dummy_newdle.timeslots = dummy_newdle.timeslots[1:]
+    db_session.flush()
+    dummy_newdle.sync_slot_claims()
+    assert {c.timeslot for c in SlotClaim.query} == {slot2}
+
+
+def _decode_answers(encoded, timeslots):
+    # what the client does with the compact answers
+    answers = {
+        '1': Availability.unavailable,
+        '2': Availability.available,
+        '3': Availability.ifneedbe,
+    }
+    assert len(encoded) == len(timeslots)
+    return {
+        slot: answers[code]
+        for slot, code in zip(timeslots, encoded, strict=True)
+        if code != '0'
+    }
+
+
+def test_encode_answers():
+    timeslots = [
+        datetime(2019, 9, 11, 13, 0),
+        datetime(2019, 9, 11, 14, 0),
+        datetime(2019, 9, 12, 13, 0),
+        datetime(2019, 9, 12, 13, 30),
+    ]
+    answers = {
+        timeslots[0]: Availability.available,
+        timeslots[2]: Availability.unavailable,
+        timeslots[3]: Availability.ifneedbe,
+    }
+    assert encode_answers(answers, timeslots) == '2013'
+    assert _decode_answers('2013', timeslots) == answers
+    assert encode_answers({}, timeslots) == '0000'
+    assert _decode_answers('0000', timeslots) == {}
+    # answers for timeslots which no longer exist are skipped
+    assert encode_answers(answers, timeslots[1:]) == '013'
+
+
+def test_participant_unique_auth_uid(dummy_newdle, db_session):
+    dummy_newdle.participants.add(
+        Participant(name='Guinea Pig', email='example@example.com', auth_uid='pig')
+    )
+    with pytest.raises(IntegrityError):
+        db_session.flush()
+
+
+@pytest.mark.parametrize(
+    ('criteria', 'index'),
+    (
+        ({'auth_uid': 'pig'}, 'ix_participants_auth_uid'),
+        ({'newdle_id': 1, 'auth_uid': 'pig'}, 'ix_uq_participants_newdle_id_auth_uid'),
+    ),
+)
+@pytest.mark.usefixtures('dummy_newdle')
+def test_participant_auth_uid_indexes(db_session, criteria, index):
+    # the test database is tiny, so postgres would always prefer a sequential
+    # scan without this
+    db_session.execute(db.text('SET LOCAL enable_seqscan = off'))
+    query = Participant.query.filter_by(**criteria).statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}
+    )
+    plan = db_session.execute(db.text(f'EXPLAIN {query}')).scalars()
+    assert index in '\n'.join(plan)
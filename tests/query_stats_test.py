@@ -0,0 +1,51 @@
+import re
+
+import pytest
+from flask import url_for
+from sqlalchemy.exc import ProgrammingError
+
+from newdle.core.db import db
+from newdle.core.query_stats import QueryStats
+
+
+def test_query_stats():
+    stats = QueryStats()
+    stats.add('SELECT 1', 0.002)
+    stats.add('SELECT 2', 0.005)
+    stats.add('SELECT 3', 0.001)
+    assert stats.count == 3
+    assert stats.slowest_statement == 'SELECT 2'
+    assert str(stats) == 'count=3; duration=8.0ms'
+
+
+@pytest.mark.usefixtures('app')
+def test_query_stats_failed_query(mocker):
+    stats = QueryStats()
+    mocker.patch('newdle.core.query_stats.get_query_stats', return_value=stats)
+    with db.engine.connect() as conn:
+        with pytest.raises(ProgrammingError):
+            conn.exec_driver_sql('SELECT * FROM does_not_exist')
+        assert not conn.info['query_start_time']
+    assert stats.count == 1
+    assert stats.slowest_statement == 'SELECT * FROM does_not_exist'
+
+
+@pytest.mark.usefixtures('dummy_newdle')
+def test_query_stats_header(flask_client, override_config):
+    resp = flask_client.get(url_for('api.get_newdle', code='dummy'))
+    assert 'X-Newdle-Query-Stats' not in resp.headers
+    override_config(DEBUG=True)
+    resp = flask_client.get(url_for('api.get_newdle', code='dummy'))
+    stats = resp.headers['X-Newdle-Query-Stats']
+    assert re.fullmatch(r'count=\d+; duration=\d+\.\dms', stats)
+
+
+@pytest.mark.usefixtures('dummy_newdle')
+def test_query_time_budget(flask_client, override_config, mocker):
+    logger = mocker.patch('newdle.core.query_stats.current_app.logger')
+    flask_client.get(url_for('api.get_newdle', code='dummy'))
+    logger.warning.assert_not_called()
+    override_config(QUERY_TIME_BUDGET=0)
+    flask_client.get(url_for('api.get_newdle', code='dummy'))
+    logger.warning.assert_called_once()
+    assert logger.warning.call_args.args[1] == '/api/newdle/dummy'
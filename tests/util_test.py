@@ -1,4 +1,19 @@
-from newdle.core.util import check_user_signature, sign_user
+import threading
+from datetime import datetime
+
+import pytest
+
+from newdle.core.util import (
+    DATETIME_FORMAT,
+    _render_user_avatar,
+    check_user_signature,
+    format_dt,
+    format_dts,
+    get_executor,
+    parse_dt,
+    render_user_avatar,
+    sign_user,
+)
 
 
 def test_signatures():
@@ -23,3 +38,67 @@ def test_signature_check():
     # check that a small change in the data results in failing verification
     user_data['uid'] = 'leroz'
     assert not check_user_signature(user_data, 'c2fYpLArdmnNyq45uKbx7bdMrTs')
+
+
+def test_render_user_avatar_cached(app, mocker):
+    _render_user_avatar.cache_clear()
+    render_template = mocker.patch(
+        'newdle.core.util.render_template', return_value='<svg/>'
+    )
+    with app.test_request_context():
+        first = render_user_avatar('g', '32')
+        second = render_user_avatar('G', '32')
+        render_user_avatar('G', '64')
+        render_user_avatar('G', 'x')
+    assert first.get_data() == second.get_data() == b'<svg/>'
+    assert first.get_etag() == second.get_etag()
+    assert render_template.call_args_list == [
+        mocker.call('avatar.svg', text='G', size=32),
+        mocker.call('avatar.svg', text='G', size=64),
+        mocker.call('avatar.svg', text='G', size=None),
+    ]
+    _render_user_avatar.cache_clear()
+
+
+@pytest.mark.parametrize(
+    'text',
+    ('2020-01-02T03:04', '1999-12-31T23:59', '0001-01-01T00:00'),
+)
+def test_parse_format_dt(text):
+    dt = parse_dt(text)
+    assert dt == datetime.strptime(text, DATETIME_FORMAT)
+    assert format_dt(dt) == text
+
+
+@pytest.mark.parametrize(
+    'text',
+    (
+        '',
+        '2020-1-02T03:04',
+        '2020-01-02 03:04',
+        '2020-01-02T03:04:05',
+        '2020-01-02T03:0x',
+        '2020-01-02T+3:04',
+        '2020-01-02T0_:04',
+        '\uff12020-01-02T03:04',
+        '2020-13-02T03:04',
+        '2020-02-30T03:04',
+        '2020-01-02T24:00',
+    ),
+)
+def test_parse_dt_invalid(text):
+    with pytest.raises(ValueError):
+        parse_dt(text)
+
+
+def test_format_dts():
+    dts = [datetime(2020, 1, 2, 3, 4), datetime(2020, 1, 2, 5, 6)]
+    assert format_dts(dts) == ['2020-01-02T03:04', '2020-01-02T05:06']
+
+
+@pytest.mark.usefixtures('app')
+def test_get_executor():
+    executor = get_executor('test', 'FREE_BUSY_MAX_WORKERS')
+    assert get_executor('test', 'FREE_BUSY_MAX_WORKERS') is executor
+    assert get_executor('test-other', 'FREE_BUSY_MAX_WORKERS') is not executor
+    assert executor.submit(threading.current_thread).result().name.startswith('test_')